@@ -0,0 +1,70 @@
+"""
+Report how many equivalence classes (blocks identical up to relabeling of qubits) partitions of benchmark programs have
+
+Usage: python bench_classes.py [--families qft ripple_adder mult ham ...] [--grains 2 3] [--tol 1e-8]
+                               [--max-gates 20000] [--output bench_classes]
+
+Each row records the number of blocks and classes of one circuit at one grain, and the reduction ratio (blocks per
+class) of per-block work; with --tol, classes of unitarily equivalent blocks are also merged. Per-family totals are
+printed and results are written to <output>.csv.
+"""
+import os
+import sys
+import time
+import yaml
+import argparse
+import pandas as pd
+from rich.console import Console
+from rich.table import Table
+
+sys.path.append('..')
+
+import mosaic
+
+console = Console()
+
+parser = argparse.ArgumentParser(description='Report equivalence classes of partitioned blocks')
+parser.add_argument('--families', nargs='*', default=None, help='benchmark families (default: circ_dpaths in config.yaml)')
+parser.add_argument('--grains', nargs='*', type=int, default=[2, 3])
+parser.add_argument('--tol', type=float, default=None, help='infidelity tolerance of unitary equivalence')
+parser.add_argument('--max-gates', type=int, default=None, help='skip circuits with more gates')
+parser.add_argument('--output', default='bench_classes')
+args = parser.parse_args()
+
+benchmark_dpath = '.'
+with open(os.path.join(benchmark_dpath, 'config.yaml'), 'r') as f:
+    config = yaml.safe_load(f)
+
+families = args.families if args.families else config['circ_dpaths']
+records = []
+for family in families:
+    dpath = os.path.join(benchmark_dpath, family)
+    for fname in sorted(os.listdir(dpath)):
+        if not fname.endswith('.qasm'):
+            continue
+        circ = mosaic.qasm.read_qasm(os.path.join(dpath, fname))
+        if args.max_gates is not None and len(circ) > args.max_gates:
+            console.print('Skip {} ({} gates)'.format(fname, len(circ)), style='yellow')
+            continue
+        for grain in args.grains:
+            if grain < int(circ.weights.max()):
+                continue
+            blocks = mosaic.partition.seq_partition(circ, grain)
+            start = time.perf_counter()
+            classes = mosaic.equivalence.block_classes(blocks, args.tol)
+            records.append({'family': family, 'circ_name': fname.split('.')[0], 'grain': grain,
+                            'num_blocks': len(blocks), 'num_classes': len(classes),
+                            'reduction_ratio': classes.reduction_ratio, 'time': time.perf_counter() - start})
+            console.print(records[-1])
+
+df = pd.DataFrame(records)
+df.to_csv('{}.csv'.format(args.output), index=False)
+
+summary = df.groupby(['family', 'grain'])[['num_blocks', 'num_classes']].sum().reset_index()
+table = Table(title='Equivalence classes of blocks' + (' (tol={})'.format(args.tol) if args.tol is not None else ''))
+for col in ['family', 'grain', 'blocks', 'classes', 'reduction ratio']:
+    table.add_column(col)
+for _, row in summary.iterrows():
+    table.add_row(row['family'], str(row['grain']), str(row['num_blocks']), str(row['num_classes']),
+                  '{:.2f}'.format(row['num_blocks'] / row['num_classes']))
+console.print(table)
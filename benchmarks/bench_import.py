@@ -0,0 +1,50 @@
+"""
+Benchmark startup cost of `import mosaic; mosaic.partition.seq_partition` (e.g., for headless worker processes)
+
+Usage: python bench_import.py [--repeat 10] [--attr partition.seq_partition]
+
+Each repeat runs in a fresh interpreter, recording wall time of the import and attribute access, peak RSS of the
+process, and which heavy optional modules (plotting, notebooks, ...) got imported along the way.
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+import numpy as np
+from rich.console import Console
+
+console = Console()
+
+parser = argparse.ArgumentParser(description='Benchmark import time of mosaic')
+parser.add_argument('--repeat', type=int, default=10)
+parser.add_argument('--attr', default='partition.seq_partition', help='attribute of mosaic to access after import')
+args = parser.parse_args()
+
+heavy_modules = ['matplotlib', 'pydot', 'IPython', 'pandas']
+
+script = '''
+import sys, time, json, resource
+start = time.perf_counter()
+import mosaic
+mosaic.{attr}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'time': elapsed, 'maxrss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  'modules': [m for m in {heavy} if m in sys.modules]}}))
+'''.format(attr=args.attr, heavy=heavy_modules)
+
+package_dpath = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+env = dict(os.environ, PYTHONPATH=os.pathsep.join([package_dpath, os.environ.get('PYTHONPATH', '')]))
+
+records = []
+for _ in range(args.repeat):
+    out = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True, check=True)
+    records.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+times = np.array([rec['time'] for rec in records])
+maxrss = np.array([rec['maxrss'] for rec in records])
+console.print('import mosaic; mosaic.{}'.format(args.attr))
+console.print('time: median {:.3f} s, min {:.3f} s, max {:.3f} s ({} runs)'.format(
+    np.median(times), times.min(), times.max(), args.repeat))
+console.print('peak RSS: median {:.1f} MiB'.format(np.median(maxrss) / 1024))
+console.print('heavy modules imported: {}'.format(records[0]['modules']))
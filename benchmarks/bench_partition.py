@@ -0,0 +1,140 @@
+"""
+Benchmark throughput of partitioning over benchmark programs in config.yaml
+
+Usage: python bench_partition.py [--families qft random ...] [--grains 2 3 4] [--repeat 3] [--max-gates 20000]
+                                 [--output bench_partition] [--baseline bench_partition.csv] [--tolerance 0.2]
+                                 [--min-time 1e-2]
+
+Each row records wall time (best of repeats) and peak memory (by tracemalloc) of one stage on one circuit:
+    load (QASM -> cirq), circuit_to_dag, seq_partition (each grain), contract_1q_gates_on_dag
+Results are written to <output>.csv and <output>.json; with --baseline, stages slower than the baseline by more than
+the tolerance (relative) are reported as regressions, and the exit code is nonzero if there is any. Stages faster than
+--min-time in both runs are dominated by timer noise and not compared. The exit code is only meaningful with repeats
+(best of --repeat, at least 3), since a single timing of a stage is easily off by more than the tolerance.
+"""
+import os
+import sys
+import json
+import time
+import yaml
+import argparse
+import tracemalloc
+import pandas as pd
+from rich.console import Console
+from cirq.contrib.qasm_import import circuit_from_qasm
+
+sys.path.append('..')
+
+import mosaic
+
+console = Console()
+
+parser = argparse.ArgumentParser(description='Benchmark throughput of partitioning')
+parser.add_argument('--families', nargs='*', default=None, help='benchmark families (default: circ_dpaths in config.yaml)')
+parser.add_argument('--grains', nargs='*', type=int, default=[2, 3, 4])
+parser.add_argument('--repeat', type=int, default=3, help='number of repeats of timing (best is recorded)')
+parser.add_argument('--max-gates', type=int, default=None, help='skip circuits with more gates')
+parser.add_argument('--output', default='bench_partition')
+parser.add_argument('--baseline', default=None, help='CSV file of a previous run to compare with')
+parser.add_argument('--tolerance', type=float, default=0.2)
+parser.add_argument('--min-time', type=float, default=1e-2, help='stages faster than this (in seconds) are not compared')
+args = parser.parse_args()
+
+
+def measure(func, *func_args):
+    """Return (result, best wall time, peak memory in bytes) of func(*func_args)"""
+    times = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        res = func(*func_args)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func(*func_args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return res, min(times), peak
+
+
+def load_qasm(fname):
+    with open(fname, 'r') as f:
+        return circuit_from_qasm(f.read())
+
+
+benchmark_dpath = '.'
+with open(os.path.join(benchmark_dpath, 'config.yaml'), 'r') as f:
+    config = yaml.safe_load(f)
+
+families = args.families if args.families else config['circ_dpaths']
+fnames = []
+for family in families:
+    dpath = os.path.join(benchmark_dpath, family)
+    fnames.extend([(family, os.path.join(dpath, fname)) for fname in sorted(os.listdir(dpath)) if fname.endswith('.qasm')])
+
+records = []
+for family, fname in fnames:
+    circ_name = fname.split('/')[-1].split('.')[0]
+    circ, load_time, load_peak = measure(load_qasm, fname)
+    num_gates = mosaic.circuits.num_gates(circ)
+    if args.max_gates is not None and num_gates > args.max_gates:
+        console.print('Skip {} ({} gates)'.format(circ_name, num_gates), style='yellow')
+        continue
+    info = {
+        'family': family,
+        'circ_name': circ_name,
+        'num_qubits': len(circ.all_qubits()),
+        'num_gates': num_gates,
+        'num_2q_gates': mosaic.circuits.num_nonlocal_gates(circ),
+    }
+    console.rule(circ_name)
+    stages = [('load', None, load_time, load_peak, None)]
+    dag, t, peak = measure(mosaic.circuits.circuit_to_dag, circ)
+    stages.append(('circuit_to_dag', None, t, peak, None))
+    for grain in args.grains:
+        if grain < mosaic.circuits.max_gate_weight(circ):
+            continue
+        blocks, t, peak = measure(mosaic.partition.seq_partition, circ, grain)
+        stages.append(('seq_partition', grain, t, peak, len(blocks)))
+    contracted, t, peak = measure(mosaic.passes.contract_1q_gates_on_dag, dag)
+    stages.append(('contract_1q_gates_on_dag', None, t, peak, contracted.num_nodes()))
+
+    for stage, grain, t, peak, num_blocks in stages:
+        records.append({**info, 'stage': stage, 'grain': grain, 'time': t, 'peak_memory': peak,
+                        'num_blocks': num_blocks})
+        console.print('{:<26}{:>6}{:>12.4f} s{:>12.2f} MiB{:>10}'.format(
+            stage, grain if grain else '', t, peak / 2 ** 20, num_blocks if num_blocks is not None else ''))
+
+results = pd.DataFrame(records, columns=['family', 'circ_name', 'num_qubits', 'num_gates', 'num_2q_gates', 'stage',
+                                         'grain', 'time', 'peak_memory', 'num_blocks'])
+results.to_csv(args.output + '.csv', index=False)
+with open(args.output + '.json', 'w') as f:
+    json.dump(records, f, indent=2)
+console.print('Results written to {}.csv and {}.json'.format(args.output, args.output))
+
+if args.baseline is not None:
+    baseline = pd.read_csv(args.baseline)
+    keys = ['circ_name', 'stage', 'grain']
+    for df in [results, baseline]:
+        df['grain'] = df['grain'].fillna(0).astype(int)
+    merged = results.merge(baseline[keys + ['time', 'num_blocks']], on=keys, suffixes=('', '_baseline'))
+    changed = merged[merged['num_blocks'].fillna(-1) != merged['num_blocks_baseline'].fillna(-1)]
+    num_matched = len(merged)
+    merged = merged[merged[['time', 'time_baseline']].max(axis=1) >= args.min_time].copy()
+    merged['ratio'] = merged['time'] / merged['time_baseline']
+    regressions = merged[merged['ratio'] > 1 + args.tolerance]
+    console.rule('Comparison with {}'.format(args.baseline))
+    if args.repeat < 3:
+        console.print('Timings are repeated fewer than 3 times (--repeat {}), regressions might be noise'.format(
+            args.repeat), style='yellow')
+    console.print('{} stages compared, {} faster than {} s skipped'.format(
+        len(merged), num_matched - len(merged), args.min_time))
+    console.print('Geometric mean of time ratios: {:.3f}'.format(merged['ratio'].prod() ** (1 / max(len(merged), 1))))
+    for _, row in regressions.iterrows():
+        console.print('Regression: {} {} {}: {:.4f} s -> {:.4f} s ({:.2f}x)'.format(
+            row['circ_name'], row['stage'], row['grain'] or '', row['time_baseline'], row['time'], row['ratio']),
+            style='bold red')
+    for _, row in changed.iterrows():
+        console.print('Changed number of blocks: {} {} {}: {} -> {}'.format(
+            row['circ_name'], row['stage'], row['grain'] or '', row['num_blocks_baseline'], row['num_blocks']),
+            style='bold red')
+    if len(regressions) or len(changed):
+        sys.exit(1)
@@ -0,0 +1,44 @@
+"""
+Benchmark scaling of seq_partition over random circuits of growing width
+
+Usage: python bench_scaling.py [--num-qubits 64 128 256 512 1024] [--depth 20] [--grains 2 3] [--seed 123]
+                               [--output bench_scaling]
+
+Circuits are generated by mosaic.random_circuits.random_circuit (compact, thus without cirq operations until
+blocks are built); each row records the generation time and the partitioning time of one circuit at one grain.
+Results are written to <output>.csv.
+"""
+import sys
+import time
+import argparse
+import pandas as pd
+from rich.console import Console
+
+sys.path.append('..')
+
+import mosaic
+
+console = Console()
+
+parser = argparse.ArgumentParser(description='Benchmark scaling of partitioning over random circuits')
+parser.add_argument('--num-qubits', nargs='*', type=int, default=[64, 128, 256, 512, 1024])
+parser.add_argument('--depth', type=int, default=20)
+parser.add_argument('--grains', nargs='*', type=int, default=[2, 3])
+parser.add_argument('--seed', type=int, default=123)
+parser.add_argument('--output', default='bench_scaling')
+args = parser.parse_args()
+
+random_circuit = mosaic.random_circuits.random_circuit  # imported before timing
+records = []
+for num_qubits in args.num_qubits:
+    start = time.perf_counter()
+    circ = random_circuit(num_qubits, args.depth, seed=args.seed)
+    gen_time = time.perf_counter() - start
+    for grain in args.grains:
+        start = time.perf_counter()
+        blocks = mosaic.partition.seq_partition(circ, grain)
+        records.append({'num_qubits': num_qubits, 'depth': args.depth, 'num_gates': len(circ), 'grain': grain,
+                        'num_blocks': len(blocks), 'gen_time': gen_time, 'partition_time': time.perf_counter() - start})
+        console.print(records[-1])
+
+pd.DataFrame(records).to_csv('{}.csv'.format(args.output), index=False)
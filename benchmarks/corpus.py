@@ -0,0 +1,201 @@
+"""
+Preprocess benchmark programs listed in config.yaml (e.g., decompose SWAP and Toffoli) and summarize their information
+into description.csv, in one pass
+
+Usage: python corpus.py [--families qft random ...] [--workers 4] [--output-dpath decomposed]
+                        [--cache corpus_cache.json] [--description description.csv] [--force]
+
+Each QASM file is parsed once, by the streaming reader of mosaic.qasm in a process pool, into its statistics:
+number of qubits, gates, 2Q gates, depth, gate histogram and idle wires. Files with SWAP or Toffoli (CCX) gates are
+written decomposed (as defined in qelib1.inc) into <output-dpath>/<family>/ instead of being overwritten, and their
+statistics are those of the decomposed variants. Files the streaming reader does not support (e.g., with gate
+definitions) are parsed by cirq's importer instead and not decomposed; the parser column of their rows is "cirq", and
+their gate histograms are keyed by cirq gates rather than QASM gate names, while their numbers of qubits still come
+from the declared registers. Statistics are cached by file path and validated by mtime and size (then by SHA-1 of
+the contents), so unchanged files are skipped in later runs.
+"""
+import os
+import re
+import sys
+import json
+import yaml
+import hashlib
+import argparse
+import pandas as pd
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from rich.console import Console
+
+sys.path.append('..')
+
+import mosaic
+
+console = Console()
+
+parser = argparse.ArgumentParser(description='Preprocess and summarize benchmark programs')
+parser.add_argument('--families', nargs='*', default=None, help='benchmark families (default: circ_dpaths in config.yaml)')
+parser.add_argument('--workers', type=int, default=os.cpu_count())
+parser.add_argument('--output-dpath', default='decomposed', help='directory of decomposed variants')
+parser.add_argument('--cache', default='corpus_cache.json')
+parser.add_argument('--description', default='description.csv')
+parser.add_argument('--force', action='store_true', help='ignore the cache')
+
+_qreg_pattern = re.compile(r'\bqreg\s+([A-Za-z_]\w*)\s*\[\s*(\d+)\s*\]')
+
+# decompositions of qelib1.inc, as (gate, operand positions) sequences
+DECOMPOSITIONS = {
+    'swap': [('cx', (0, 1)), ('cx', (1, 0)), ('cx', (0, 1))],
+    'ccx': [('h', (2,)), ('cx', (1, 2)), ('tdg', (2,)), ('cx', (0, 2)), ('t', (2,)), ('cx', (1, 2)), ('tdg', (2,)),
+            ('cx', (0, 2)), ('t', (1,)), ('t', (2,)), ('h', (2,)), ('cx', (0, 1)), ('t', (0,)), ('tdg', (1,)),
+            ('cx', (0, 1))],
+}
+
+
+def process(fname: str, variant_fname: str) -> dict:
+    """Parse a QASM file into its statistics, writing its decomposed variant if it has SWAP or Toffoli gates"""
+    registers = {}
+    qasm_parser = 'mosaic'
+    try:
+        gates = list(mosaic.qasm.iter_qasm(fname, registers=registers))
+    except mosaic.qasm.UnsupportedQasm as err:  # statistics by cirq's importer, without decomposition
+        qasm_parser = 'cirq'
+        cc = mosaic.qasm.read_qasm(fname)  # only used qubits are kept, thus registers are taken from the source
+        gates = [(str(cc.gate_table[code]), (), tuple(row[:w]))
+                 for code, row, w in zip(cc.opcodes.tolist(), cc.qubits.tolist(), cc.weights.tolist())]
+        registers = declared_registers(fname)
+        variant_fname = None
+        console.print('{}: {}, not decomposed'.format(fname, err), style='yellow')
+    else:
+        if any(name in DECOMPOSITIONS for name, _, _ in gates):
+            gates = [(name, params, qubits) for name, params, qubits in _decompose(gates)]
+            _write_qasm(variant_fname, registers, gates)
+        else:
+            variant_fname = None
+
+    num_qubits = sum(size for _, size in registers.values())
+    last_layers = {}  # qubit -> the last layer acting on it
+    for _, _, qubits in gates:
+        layer = max([last_layers.get(q, -1) for q in qubits], default=-1) + 1
+        for q in qubits:
+            last_layers[q] = layer
+    return {
+        'num_qubits': num_qubits,
+        'num_gates': len(gates),
+        'num_2q_gates': sum(len(qubits) > 1 for _, _, qubits in gates),
+        'depth': max(last_layers.values(), default=-1) + 1,
+        'idle_qubits': num_qubits - len(last_layers),
+        'gate_counts': json.dumps(dict(sorted(Counter(name for name, _, _ in gates).items()))),
+        'variant': variant_fname,
+        'parser': qasm_parser,
+    }
+
+
+def declared_registers(fname: str) -> dict:
+    """Quantum registers declared in a QASM file, as name -> (offset, size) like mosaic.qasm.iter_qasm records"""
+    with open(fname, 'r') as f:
+        source = re.sub(r'//.*', '', f.read())
+    registers = {}
+    offset = 0
+    for reg, size in _qreg_pattern.findall(source):
+        registers[reg] = (offset, int(size))
+        offset += int(size)
+    return registers
+
+
+def _decompose(gates):
+    for name, params, qubits in gates:
+        if name in DECOMPOSITIONS:
+            for sub_name, positions in DECOMPOSITIONS[name]:
+                yield sub_name, (), tuple(qubits[i] for i in positions)
+        else:
+            yield name, params, qubits
+
+
+def _write_qasm(fname, registers, gates):
+    qubit_names = ['{}[{}]'.format(reg, i) for reg, (_, size) in registers.items() for i in range(size)]
+    os.makedirs(os.path.dirname(fname), exist_ok=True)
+    with open(fname, 'w') as f:
+        f.write('OPENQASM 2.0;\ninclude "qelib1.inc";\n')
+        for reg, (_, size) in registers.items():
+            f.write('qreg {}[{}];\n'.format(reg, size))
+        for name, params, qubits in gates:
+            if params:
+                name = '{}({})'.format(name, ','.join(map(repr, params)))
+            f.write('{} {};\n'.format(name, ','.join(qubit_names[q] for q in qubits)))
+
+
+def file_signature(fname: str) -> dict:
+    stat = os.stat(fname)
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def file_hash(fname: str) -> str:
+    with open(fname, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def is_cached(entry: dict, fname: str) -> bool:
+    """Whether the cache entry is valid for the file, refreshing its signature if only the mtime changed"""
+    if entry is None or 'parser' not in entry['row']:  # entries of older versions
+        return False
+    if entry['row']['variant'] is not None and not os.path.exists(entry['row']['variant']):
+        return False
+    signature = file_signature(fname)
+    if all(entry[key] == value for key, value in signature.items()):
+        return True
+    if entry['sha1'] == file_hash(fname):
+        entry.update(signature)
+        return True
+    return False
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    benchmark_dpath = '.'
+    with open(os.path.join(benchmark_dpath, 'config.yaml'), 'r') as f:
+        config = yaml.safe_load(f)
+
+    families = args.families if args.families else config['circ_dpaths']
+    fnames = []
+    for family in families:
+        dpath = os.path.join(benchmark_dpath, family)
+        fnames.extend([(family, os.path.join(dpath, fname)) for fname in sorted(os.listdir(dpath))
+                       if fname.endswith('.qasm')])
+
+    cache = {}
+    if not args.force and os.path.exists(args.cache):
+        with open(args.cache, 'r') as f:
+            cache = json.load(f)
+
+    pending = [(family, fname) for family, fname in fnames if not is_cached(cache.get(fname), fname)]
+    console.print('{} files, {} cached, {} to process'.format(len(fnames), len(fnames) - len(pending), len(pending)))
+    variant_fnames = [os.path.join(args.output_dpath, os.path.basename(os.path.normpath(family)),
+                                   os.path.basename(fname)) for family, fname in pending]
+    if any(os.path.realpath(variant) == os.path.realpath(fname)
+           for variant, (_, fname) in zip(variant_fnames, pending)):
+        raise ValueError('decomposed variants must not overwrite sources, choose another --output-dpath.')
+    if args.workers is not None and args.workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(args.workers) as executor:
+            rows = list(executor.map(process, [fname for _, fname in pending], variant_fnames, chunksize=4))
+    else:
+        rows = list(map(process, [fname for _, fname in pending], variant_fnames))
+    for (family, fname), row in zip(pending, rows):
+        cache[fname] = {**file_signature(fname), 'sha1': file_hash(fname), 'row': row}
+        if row['idle_qubits']:
+            console.print('!!!!! {} !!!!! There is unused qubits ({}/{})'.format(
+                fname, row['num_qubits'] - row['idle_qubits'], row['num_qubits']), style='bold red')
+        if row['variant'] is not None:
+            console.print('Decompose SWAP/Toffoli gates from {} into {}'.format(fname, row['variant']))
+
+    with open(args.cache, 'w') as f:
+        json.dump(cache, f)
+
+    description = pd.DataFrame([{'circ_name': os.path.basename(fname).split('.')[0], 'family': family,
+                                 **cache[fname]['row']} for family, fname in fnames])
+    description = description[['circ_name', 'num_qubits', 'num_gates', 'num_2q_gates', 'depth', 'family',
+                               'idle_qubits', 'gate_counts', 'variant', 'parser']]
+    description.to_csv(args.description, index=False)
+    console.print(description[['circ_name', 'num_qubits', 'num_gates', 'num_2q_gates', 'depth']])
+    qasm_gate_counts = description['gate_counts'][description['parser'] == 'mosaic']
+    all_gate_names = sorted(set().union(*[json.loads(counts) for counts in qasm_gate_counts]))
+    console.print('All gates occurring in benchmarks: {}'.format(all_gate_names))
@@ -1,6 +1,21 @@
-from . import graphs
-from . import gates
-from . import circuits
-from . import partition
-from . import passes
-from . import utils
+"""
+Submodules are imported on first attribute access (e.g., mosaic.partition), so that `import mosaic` is cheap
+and only pays for what is used, e.g., headless workers never import the plotting backends of visualization.
+"""
+import importlib
+
+__all__ = ['graphs', 'gates', 'circuits', 'partition', 'passes', 'utils', 'compact', 'cache', 'unitaries', 'pec',
+           'simulation', 'sweep', 'profiling', 'qasm', 'visualization', 'equivalence',
+           'random_circuits']
+
+
+def __getattr__(name: str):
+    if name in __all__:
+        module = importlib.import_module('.' + name, __name__)
+        globals()[name] = module
+        return module
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,119 @@
+"""
+Content-addressed cache of partitioning results
+"""
+import os
+import json
+import hashlib
+import cirq
+from collections import OrderedDict
+from typing import List, Optional
+
+
+def circuit_fingerprint(circ: cirq.Circuit) -> str:
+    """
+    Stable structural hash of a circuit, i.e., gate types and parameters, qubit wiring and moment structure.
+    Qubits are relabeled by their sorted order, and the hash is stable across processes (unlike hash()).
+    """
+    qubit_index = {q: i for i, q in enumerate(sorted(circ.all_qubits()))}
+    digest = hashlib.sha256()
+    for moment in circ:
+        for op in moment:
+            digest.update('{}{}'.format(repr(op.gate), [qubit_index[q] for q in op.qubits]).encode())
+        digest.update(b'|')
+    return digest.hexdigest()
+
+
+class PartitionCache:
+    """
+    Content-addressed cache of partitioning results (e.g., of seq_partition), keyed by circuit fingerprint and grain.
+    ---
+    Blocks are stored as gate indices (positions in circ.all_operations()) of each moment of each block, so that
+    cached blocks are rebuilt from operations of the queried circuit with the same moment structure.
+    There is an in-memory LRU tier of at most max_entries entries, and an optional on-disk tier (one JSON file per
+    entry under cache_dir) of at most max_disk_bytes bytes, whose least recently used files are evicted first.
+    """
+
+    def __init__(self, max_entries: int = 128, cache_dir: str = None, max_disk_bytes: int = 2 ** 30):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    @staticmethod
+    def key(circ: cirq.Circuit, grain: int) -> str:
+        return hashlib.sha256('{}-{}'.format(circuit_fingerprint(circ), grain).encode()).hexdigest()
+
+    def get(self, circ: cirq.Circuit, grain: int) -> Optional[List[cirq.Circuit]]:
+        """Look up blocks of the circuit partitioned by grain, returning None on miss"""
+        key = self.key(circ, grain)
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return self._rebuild(circ, self._memory[key])
+        if self.cache_dir is not None and os.path.exists(fname := self._fname(key)):
+            with open(fname, 'r') as f:
+                entry = json.load(f)
+            os.utime(fname)  # mark as recently used
+            self._put_memory(key, entry)
+            self.hits += 1
+            self.disk_hits += 1
+            return self._rebuild(circ, entry)
+        self.misses += 1
+        return None
+
+    def put(self, circ: cirq.Circuit, grain: int, blocks: List[cirq.Circuit]):
+        """Store blocks (subcircuits consisting of operations of circ) of the circuit partitioned by grain"""
+        key = self.key(circ, grain)
+        indices = {id(op): idx for idx, op in enumerate(circ.all_operations())}
+        entry = [[[indices[id(op)] for op in moment] for moment in blk] for blk in blocks]
+        self._put_memory(key, entry)
+        if self.cache_dir is not None:
+            tmp_fname = self._fname(key) + '.tmp'
+            with open(tmp_fname, 'w') as f:
+                json.dump(entry, f, separators=(',', ':'))
+            os.replace(tmp_fname, self._fname(key))
+            self._evict_disk()
+
+    def clear(self):
+        """Clear both tiers and reset counters"""
+        self._memory.clear()
+        if self.cache_dir is not None:
+            for fname in self._disk_files():
+                os.remove(fname)
+        self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses, 'entries': len(self._memory)}
+
+    def _put_memory(self, key: str, entry: List[List[List[int]]]):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _fname(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def _disk_files(self) -> List[str]:
+        return [os.path.join(self.cache_dir, fname) for fname in os.listdir(self.cache_dir) if fname.endswith('.json')]
+
+    def _evict_disk(self):
+        files = sorted(self._disk_files(), key=os.path.getmtime)
+        total = sum(map(os.path.getsize, files))
+        while files and total > self.max_disk_bytes:
+            fname = files.pop(0)
+            total -= os.path.getsize(fname)
+            os.remove(fname)
+
+    @staticmethod
+    def _rebuild(circ: cirq.Circuit, entry: List[List[List[int]]]) -> List[cirq.Circuit]:
+        ops = list(circ.all_operations())
+        return [cirq.Circuit([cirq.Moment([ops[idx] for idx in moment]) for moment in blk]) for blk in entry]
@@ -0,0 +1,152 @@
+"""
+Compact integer representation of circuits for the hot paths (e.g., partitioning)
+"""
+import cirq
+import numpy as np
+from typing import FrozenSet, List, Iterable, Iterator, Sequence
+
+from .utils import popcount
+
+
+class CompactCircuit:
+    """
+    Array-backed representation of a sequence of gates, where qubits are relabeled by small integers.
+    ---
+    Gate i acts on qubits[i, :weights[i]] (row padded with -1) and its cirq gate is gate_table[opcodes[i]].
+    Qubit sets of gates are also kept as bitmasks (masks[i]), so that overlaps and unions of qubit sets are
+    integer bit operations. Masks are Python integers instead of a NumPy array since the number of qubits is
+    unbounded and scalar bit operations on Python integers are faster in loops.
+    Conversion from/to cirq only happens at the boundaries (from_ops/from_circuit and op/to_circuit).
+    """
+
+    def __init__(self, qubits: np.ndarray, weights: np.ndarray, opcodes: np.ndarray,
+                 gate_table: List[cirq.Gate], qubit_table: List[cirq.Qid], ops: List[cirq.Operation] = None):
+        self.qubits = qubits
+        self.weights = weights
+        self.opcodes = opcodes
+        self.gate_table = gate_table
+        self.qubit_table = qubit_table
+        self.ops = ops  # original operations if available, avoiding reconstruction at the output boundary
+        self.masks = [sum(1 << q for q in row[:w]) for row, w in zip(qubits.tolist(), weights.tolist())]
+
+    @classmethod
+    def from_ops(cls, ops: Iterable[cirq.Operation], qubit_order: Sequence[cirq.Qid] = None,
+                 keep_ops: bool = True) -> 'CompactCircuit':
+        """
+        Build the compact representation from a sequence of operations.
+
+        Args:
+            ops: Operations in topological order (e.g., circ.all_operations())
+            qubit_order: Qubits by integer label; sorted qubits of ops if not given
+            keep_ops: Whether to keep references to the original operations
+
+        Returns:
+            The compact circuit
+        """
+        ops = list(ops)
+        if qubit_order is None:
+            qubit_order = sorted({q for op in ops for q in op.qubits})
+        qubit_index = {q: i for i, q in enumerate(qubit_order)}
+        gate_index = {}
+        rows = [[qubit_index[q] for q in op.qubits] for op in ops]
+        width = max(map(len, rows), default=1)
+        qubits = np.array([row + [-1] * (width - len(row)) for row in rows], dtype=np.int32).reshape(len(rows), width)
+        weights = np.array(list(map(len, rows)), dtype=np.int8)
+        opcodes = np.array([gate_index.setdefault(op.gate, len(gate_index)) for op in ops], dtype=np.int32)
+        return cls(qubits, weights, opcodes, list(gate_index), list(qubit_order), ops if keep_ops else None)
+
+    @classmethod
+    def from_circuit(cls, circ: cirq.Circuit, keep_ops: bool = True) -> 'CompactCircuit':
+        """Build the compact representation from a circuit"""
+        return cls.from_ops(circ.all_operations(), sorted(circ.all_qubits()), keep_ops)
+
+    def __len__(self) -> int:
+        return len(self.weights)
+
+    @property
+    def num_qubits(self) -> int:
+        return len(self.qubit_table)
+
+    def op(self, idx: int) -> cirq.Operation:
+        """The cirq operation of the idx-th gate"""
+        if self.ops is not None:
+            return self.ops[idx]
+        return self.gate_table[self.opcodes[idx]].on(*[self.qubit_table[q] for q in self.qubits[idx, :self.weights[idx]]])
+
+    def to_circuit(self, indices: Iterable[int] = None) -> cirq.Circuit:
+        """Convert (a subset of, in the given order) gates to a circuit"""
+        if indices is None:
+            indices = range(len(self))
+        return cirq.Circuit([self.op(idx) for idx in indices])
+
+    def successors(self, order: Sequence[int] = None) -> List[List[int]]:
+        """
+        Dependency DAG (successor lists) of gates in the given topological order, each gate being connected to the
+        last gate acting on each of its qubits. Nodes are labeled by positions in order.
+        Complexity: O(m*w), m is the number of gates, w is the maximum gate weight
+        """
+        if order is None:
+            order = range(len(self))
+        qubits = self.qubits.tolist()
+        weights = self.weights.tolist()
+        successors = [[] for _ in range(len(order))]
+        last_writers = {}
+        for node, idx in enumerate(order):
+            for q in qubits[idx][:weights[idx]]:
+                if q in last_writers and node not in successors[last_writers[q]]:
+                    successors[last_writers[q]].append(node)
+                last_writers[q] = node
+        return successors
+
+
+class BlockView:
+    """
+    Block (subcircuit) referencing gates of a parent CompactCircuit by their indices, instead of a copy of them.
+    ---
+    It quacks like a cirq.Circuit where blocks are consumed by mosaic (all_operations, all_qubits, unitary, e.g.,
+    for unitaries.block_unitaries and circuits.blocks_to_circuit), and cirq operations are only built (or taken
+    from the original operations of the parent) on demand. A cirq.Circuit is materialized by to_circuit.
+    """
+    __slots__ = ('parent', 'indices', '_mask')
+
+    def __init__(self, parent: CompactCircuit, indices: Sequence[int]):
+        self.parent = parent
+        self.indices = indices
+        self._mask = None
+
+    def __len__(self) -> int:
+        """Number of gates"""
+        return len(self.indices)
+
+    def __repr__(self) -> str:
+        return 'BlockView(#Q={}, #G={})'.format(self.num_qubits, len(self))
+
+    @property
+    def mask(self) -> int:
+        """Bitmask of qubits (labeled as in the parent) acted on by the block"""
+        if self._mask is None:
+            masks = self.parent.masks
+            mask = 0
+            for idx in self.indices:
+                mask |= masks[idx]
+            self._mask = mask
+        return self._mask
+
+    @property
+    def num_qubits(self) -> int:
+        return popcount(self.mask)
+
+    def all_operations(self) -> Iterator[cirq.Operation]:
+        return map(self.parent.op, self.indices)
+
+    def all_qubits(self) -> FrozenSet[cirq.Qid]:
+        mask = self.mask
+        return frozenset(q for i, q in enumerate(self.parent.qubit_table) if mask >> i & 1)
+
+    def unitary(self) -> np.ndarray:
+        """Unitary of the block on its sorted qubits, as cirq.Circuit.unitary() does"""
+        return self.to_circuit().unitary()
+
+    def to_circuit(self) -> cirq.Circuit:
+        """Materialize the block as a cirq.Circuit"""
+        return self.parent.to_circuit(self.indices)
@@ -0,0 +1,180 @@
+"""
+Equivalence classes of partitioned blocks, i.e., blocks identical up to relabeling of qubits
+"""
+import cirq
+import numpy as np
+from itertools import permutations
+from typing import Hashable, List, Sequence, Tuple
+
+from .unitaries import block_key, block_unitaries
+from .utils import infidelity
+
+
+def block_fingerprint(block: cirq.Circuit) -> Tuple[Hashable, Tuple[cirq.Qid, ...]]:
+    """
+    Qubit-relabeling-invariant fingerprint of a block, together with its qubits in the canonical order.
+    ---
+    Gates are listed by (layer, local wires), where layers are ASAP layers of the block and local wires are
+    positions of qubits in an ordering of them; the ordering minimizing the listing (gates compared by repr) is
+    canonical. Thus blocks of the same fingerprint are the same up to a bijection of qubits, mapping the i-th
+    canonical qubit of one block to that of the other.
+    Complexity: O(k! * m log m) for k qubits and m gates, memoized by the structure (unitaries.block_key)
+    """
+    qubits = sorted(block.all_qubits())
+    key = block_key(block)
+    if key not in _fingerprint_cache:
+        _fingerprint_cache[key] = _canonicalize(key)
+    fingerprint, order = _fingerprint_cache[key]
+    return fingerprint, tuple(qubits[i] for i in order)
+
+
+class BlockClasses:
+    """
+    Partition of blocks into classes of blocks identical up to relabeling of qubits (see block_fingerprint), and
+    optionally merged by unitary equivalence, such that per-block work runs once per class on its representative.
+    ---
+    Attributes:
+        labels: Index of the class of each block, of shape (B,)
+        representatives: Index of the representative block of each class (its first block)
+        qubit_orders: Qubits of each block aligned with the representative, i.e., qubit_orders[b][i] plays the role
+            of qubit_orders[representatives[labels[b]]][i]
+    """
+
+    def __init__(self, blocks: Sequence[cirq.Circuit], tol: float = None):
+        self.blocks = list(blocks)
+        self.representatives = []
+        self.qubit_orders = []
+        labels = []
+        class_ids = {}
+        for idx, blk in enumerate(self.blocks):
+            fingerprint, qubits = block_fingerprint(blk)
+            if fingerprint not in class_ids:
+                class_ids[fingerprint] = len(self.representatives)
+                self.representatives.append(idx)
+            labels.append(class_ids[fingerprint])
+            self.qubit_orders.append(qubits)
+        self.labels = np.array(labels, dtype=int)
+        if tol is not None:
+            self._merge_unitary_equivalent(tol)
+
+    def __len__(self) -> int:
+        """Number of classes"""
+        return len(self.representatives)
+
+    @property
+    def reduction_ratio(self) -> float:
+        """Number of blocks per class, i.e., how many times per-block work is reduced"""
+        return len(self.blocks) / len(self.representatives) if self.representatives else 1.0
+
+    def members(self, label: int) -> List[int]:
+        """Indices of blocks of a class"""
+        return np.flatnonzero(self.labels == label).tolist()
+
+    def block_unitaries(self) -> List[np.ndarray]:
+        """
+        Unitaries of all blocks (in the qubit order of cirq.unitary, i.e., sorted qubits), computed once per class
+        and permuted for other blocks of the class (equal up to a global phase and tol for merged classes)
+        """
+        reps = block_unitaries([self.blocks[idx] for idx in self.representatives])
+        canonical = [_permute_unitary(u, _ranks(self.qubit_orders[idx]))
+                     for u, idx in zip(reps, self.representatives)]
+        results = []
+        for idx, label in enumerate(self.labels):
+            if idx == self.representatives[label]:
+                results.append(reps[label])
+            else:
+                results.append(_permute_unitary(canonical[label], _argsort(self.qubit_orders[idx])))
+        return results
+
+    def _merge_unitary_equivalent(self, tol: float):
+        """Merge classes whose representatives have unitaries equal up to relabeling within infidelity tol"""
+        reps = block_unitaries([self.blocks[idx] for idx in self.representatives])
+        merged = {}  # label -> (new label, order of canonical qubits w.r.t. the kept representative)
+        kept = {}  # number of qubits -> labels of kept classes
+        canonical = []
+        for label, (u, idx) in enumerate(zip(reps, self.representatives)):
+            canonical.append(_permute_unitary(u, _ranks(self.qubit_orders[idx])))
+            for other in kept.setdefault(len(self.qubit_orders[idx]), []):
+                perm = _equivalent_permutation(canonical[other], canonical[label], tol)
+                if perm is not None:
+                    merged[label] = (other, perm)
+                    break
+            else:
+                kept[len(self.qubit_orders[idx])].append(label)
+        new_labels = {label: i for i, label in enumerate(sorted(set(range(len(reps))) - set(merged)))}
+        for idx, label in enumerate(self.labels.tolist()):
+            if label in merged:
+                other, perm = merged[label]
+                self.qubit_orders[idx] = tuple(self.qubit_orders[idx][i] for i in perm)
+                label = other
+            self.labels[idx] = new_labels[label]
+        self.representatives = [self.representatives[label] for label in sorted(new_labels)]
+
+
+def block_classes(blocks: Sequence[cirq.Circuit], tol: float = None) -> BlockClasses:
+    """
+    Group blocks (e.g., from seq_partition) into classes of blocks identical up to relabeling of qubits.
+
+    Args:
+        blocks: Blocks (cirq.Circuit or BlockView instances)
+        tol: If given, classes whose unitaries are equal up to relabeling and a global phase within this
+            infidelity (see utils.infidelity) are merged
+
+    Returns:
+        The classes, whose labels give the class map of blocks
+    """
+    return BlockClasses(blocks, tol)
+
+
+_fingerprint_cache = {}  # block key -> (fingerprint, positions of sorted qubits in the canonical order)
+
+
+def _canonicalize(key: Tuple[int, tuple]) -> Tuple[Hashable, Tuple[int, ...]]:
+    num_qubits, gates = key
+    layers = []
+    last_layers = {}
+    for _, positions in gates:
+        layer = max([last_layers.get(i, -1) for i in positions], default=-1) + 1
+        for i in positions:
+            last_layers[i] = layer
+        layers.append(layer)
+    reprs = {}
+    for gate, _ in gates:
+        if gate not in reprs:
+            reprs[gate] = repr(gate)
+
+    best, best_perm = None, None
+    for perm in permutations(range(num_qubits)):  # perm[i] is the local wire of the i-th sorted qubit
+        listing = sorted((layer, tuple(perm[i] for i in positions), reprs[gate], gate)
+                         for layer, (gate, positions) in zip(layers, gates))
+        if best is None or [item[:3] for item in listing] < [item[:3] for item in best]:
+            best, best_perm = listing, perm
+    fingerprint = (num_qubits, tuple((layer, positions, gate) for layer, positions, _, gate in best))
+    order = tuple(sorted(range(num_qubits), key=best_perm.__getitem__))
+    return fingerprint, order
+
+
+def _argsort(qubits: Sequence[cirq.Qid]) -> List[int]:
+    """Positions of sorted qubits in qubits, i.e., the permutation from the order of qubits to the sorted order"""
+    return sorted(range(len(qubits)), key=qubits.__getitem__)
+
+
+def _ranks(qubits: Sequence[cirq.Qid]) -> List[int]:
+    """Positions of qubits in sorted qubits, i.e., the permutation from the sorted order to the order of qubits"""
+    ranks = {q: i for i, q in enumerate(sorted(qubits))}
+    return [ranks[q] for q in qubits]
+
+
+def _permute_unitary(u: np.ndarray, perm: Sequence[int]) -> np.ndarray:
+    """Unitary on qubits reordered such that the i-th new qubit is the perm[i]-th old qubit"""
+    k = len(perm)
+    u = u.reshape((2,) * 2 * k).transpose(list(perm) + [k + i for i in perm])
+    return u.reshape(2 ** k, 2 ** k)
+
+
+def _equivalent_permutation(u: np.ndarray, v: np.ndarray, tol: float) -> Tuple[int, ...]:
+    """Permutation of qubits of v making it equal to u up to a global phase within tol, if any"""
+    for perm in permutations(range(int(np.log2(u.shape[0])))):
+        if infidelity(u, _permute_unitary(v, perm)) <= tol:
+            return perm
+    return None
@@ -2,116 +2,697 @@
 Sequential partitioning algorithm by forward scanning on the circuit
 """
 
+import os
+import time
 import cirq
 import numpy as np
-import rustworkx as rx
-from typing import List, Set, Union
-from rich.console import Console
-from functools import reduce
-from operator import add
+from concurrent.futures import ProcessPoolExecutor
+from itertools import count, zip_longest
+from typing import Callable, Dict, List, Sequence, Tuple, Iterable, Iterator, Union
 
-from . import circuits, passes
-from .graphs import node_index
+from . import circuits, passes, profiling
+from .cache import PartitionCache
+from .compact import BlockView, CompactCircuit
+from .utils import popcount
 
-console = Console()
 
-
-
-def seq_partition(circ: cirq.Circuit, grain: int = 2) -> List[cirq.Circuit]:
+@profiling.timed('partition.seq_partition')
+def seq_partition(circ: Union[cirq.Circuit, CompactCircuit], grain: int = 2, workers: int = None,
+                  cache: PartitionCache = None, lookahead: int = 0,
+                  as_views: bool = False) -> Union[List[cirq.Circuit], List[BlockView]]:
     """
     Partition a list of circuits into groups of grain-qubit blocks (subcircuits) by one-round forward pass.
     ---
+    The algorithm runs on the compact representation (see CompactCircuit) of the circuit, i.e., gates are
+    integers and qubit sets are bitmasks, and blocks are converted to circuits at the end.
+    If workers is given, candidate blocks of each epoch are grown in a pool of worker processes, which yields
+    the same blocks as the serial path; it pays off for wide circuits whose front layers have many candidates.
+    If cache is given, results are looked up from (and stored into) it by the circuit fingerprint and grain.
+    The circuit might also be a CompactCircuit whose gates are in the order of moments (e.g., from qasm.read_qasm),
+    in which case cirq operations are only built for the resulting blocks.
+    Blocks are scored by the number of nonlocal gates, counted while they grow. With lookahead k > 0, each candidate
+    is scored together with the next k blocks selected greedily after it, which tends to reduce the number of
+    blocks at the cost of about k times the candidates grown per epoch.
+    If as_views is True, blocks are returned as BlockView instances referencing gates of the (compact) circuit by
+    indices rather than circuits copying them, e.g., for large circuits to be reassembled by blocks_to_circuit;
+    the cache is bypassed in that case.
     Complexity: O(m*n), m is the number of 2Q gates, n is the number of qubits
     """
+    _check_grain(circ, grain)
+    is_compact = isinstance(circ, CompactCircuit)
+    if lookahead < 0:
+        raise ValueError("lookahead must be non-negative.")
+    if cache is not None and lookahead == 0 and not as_views:  # cache entries are keyed by the grain only
+        if is_compact:  # the cache is keyed by (and rebuilds blocks from) cirq circuits
+            circ = circ.to_circuit()
+        if (blocks := cache.get(circ, grain)) is not None:
+            profiling.count('partition.cache_hits')
+            return blocks
+        blocks = seq_partition(circ, grain, workers)
+        cache.put(circ, grain, blocks)
+        return blocks
+
+    cc, first_1q_gates, order, successors = _prepare(circ)
+
+    # candidate blocks are grown speculatively on the shared front layer and rolled back, only the winner is committed
+    # nodes of the DAG are positions in order (the remaining circuit), thus front layers are sorted as in that circuit
+    frontier = passes.FrontLayer.from_successors(successors)
+    masks = [cc.masks[idx] for idx in order]
+    nonlocal_flags = [int(cc.weights[idx] > 1) for idx in order]
+    executor = None
+    if workers is not None and workers > 1:
+        executor = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                       initargs=(successors, masks, nonlocal_flags, grain, lookahead))
+    num_applied = {}  # worker pid -> number of committed nodes consumed by the frontier of that worker
+    block_nodes = []
+    try:
+        while frontier:  # for each epoch, select a block with the most nonlocal gates
+            candidates = frontier.indices()
+            profiling.count('partition.epochs')
+            profiling.count('partition.candidates', len(candidates))
+            if executor is None or len(candidates) == 1:
+                with profiling.phase('partition.grow'):
+                    block_candidates, scores = _grow_block_candidates(frontier, candidates, masks, nonlocal_flags, grain,
+                                                                      lookahead)
+            else:
+                # only ship committed nodes that some worker might not have consumed yet
+                offset = min(num_applied.values()) if len(num_applied) == workers else 0
+                committed = np.array(frontier.consumed[offset:], dtype=np.int64)
+                futures = [executor.submit(_grow_block_candidates_in_worker, offset, committed, chunk.tolist())
+                           for chunk in np.array_split(candidates, workers) if chunk.size]
+                block_candidates, scores = [], []
+                with profiling.phase('partition.grow_in_workers'):
+                    for future in futures:  # in the order of candidates, for the same tie-breaking as the serial path
+                        pid, num_consumed, results, results_scores = future.result()
+                        num_applied[pid] = num_consumed
+                        block_candidates.extend(results)
+                        scores.extend(results_scores)
+
+            block = block_candidates[np.argmax(scores)]  # the selected extended block
+            profiling.count('partition.gates_absorbed', len(block))
+            for node in block:
+                frontier.consume(node)
+            block_nodes.append(block)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return _assemble_blocks(cc, first_1q_gates, order, block_nodes, as_views)
+
+
+def _check_grain(circ: Union[cirq.Circuit, CompactCircuit], grain: int):
     if grain <= 1:
         raise ValueError("grain must be greater than 1.")
-    if grain < circuits.max_gate_weight(circ):
+    if grain < (int(circ.weights.max()) if isinstance(circ, CompactCircuit) else circuits.max_gate_weight(circ)):
         raise ValueError("grain must be no less than the maximum gate weight of the circuit.")
 
-    circ_nl = circ.copy()
-    blocks = []
-
-    # peel all 1Q gates from the first layer
-    first_1q_gates = []
-    while first_layer_1q := [g for g in circ_nl[0] if cirq.num_qubits(g) == 1]:
-        first_1q_gates.extend(first_layer_1q)
-        circ_nl.batch_remove([(0, g) for g in first_layer_1q])
-        circ_nl = cirq.Circuit(list(circ_nl.all_operations()))
-
-    dag = circuits.circuit_to_dag(circ_nl)
-    while circ_nl:  # for each epoch, select a block with the most nonlocal gates
-        front_layer = passes.obtain_front_layer(dag)
-        block_candidates = [cirq.Circuit([g]) for g in front_layer]
-        for i, (g, block) in enumerate(zip(front_layer, block_candidates)):
-            dag_peeled = dag.copy()
-            dag_peeled.remove_node(node_index(dag, g))
-            block_candidates[i] = _extend_block_over_dag(block, dag_peeled, grain)
-
-        scores = [_block_score(block) for block in block_candidates]
-        block = block_candidates[np.argmax(scores)]  # the selected extended block
-        for g in block.all_operations():
-            circ_nl = circuits.remove_gate(circ_nl, g)
-            dag.remove_node(node_index(dag, g))
-        blocks.append(block)
-
-    # add 1Q gates from first_1q_gates back to corresponding blocks
-    dag = circuits.circuit_to_dag(circ)
-    for g in reversed(first_1q_gates):
-        for blk in blocks:
-            if circuits.has_gate(blk, list(dag.successors(node_index(dag, g)))[0]):
-                blk.insert(0, g)
+
+def _prepare(circ: Union[cirq.Circuit, CompactCircuit]) -> Tuple[CompactCircuit, List[int], List[int], List[List[int]]]:
+    """
+    Convert the circuit to the compact representation, peel all 1Q gates from its first layer, and build the DAG
+    of the remaining gates (successor lists of positions in order)
+    """
+    is_compact = isinstance(circ, CompactCircuit)
+    with profiling.phase('partition.compact'):
+        cc = circ if is_compact else CompactCircuit.from_circuit(circ)
+
+    with profiling.phase('partition.peel'):
+        num_first_layer = _num_first_layer(cc) if is_compact else len(circ[0]) if len(circ) else 0
+        first_1q_gates, order = _peel_first_layer_1q_gates(cc, num_first_layer)
+
+    with profiling.phase('partition.dag'):
+        successors = cc.successors(order)
+    return cc, first_1q_gates, order, successors
+
+
+def _assemble_blocks(cc: CompactCircuit, first_1q_gates: List[int], order: List[int], block_nodes: List[List[int]],
+                     as_views: bool = False) -> Union[List[cirq.Circuit], List[BlockView]]:
+    """
+    Convert selected blocks (nodes of the DAG built by _prepare) to circuits (or views of cc), adding peeled 1Q
+    gates back
+    """
+    layout = _reattach_1q_gates(cc, first_1q_gates, order, block_nodes)
+    with profiling.phase('partition.materialize'):
+        if as_views:
+            return [BlockView(cc, leading_gates[::-1] + gates) for leading_gates, gates in layout]
+        # NOTE: in this algorithm we do not need to unify the blocks since they are already sorted
+        return [_block_circuit(cc.op, leading_gates, gates) for leading_gates, gates in layout]
+
+
+def _reattach_1q_gates(cc: CompactCircuit, first_1q_gates: List[int], order: List[int],
+                       block_nodes: List[List[int]]) -> List[Tuple[List[int], List[int]]]:
+    """
+    Add 1Q gates from first_1q_gates back to corresponding blocks (i.e., blocks containing their successors).
+    Each block of the result (in topological order) is a pair of its added 1Q gates (in reverse order) and the other
+    gates, as indices of cc
+    """
+    block_gates = [[order[node] for node in block] for block in block_nodes]
+    with profiling.phase('partition.reattach'):
+        next_gates = _next_gates_on_wires(cc, first_1q_gates)
+        gate_to_block = {idx: i for i, gates in enumerate(block_gates) for idx in gates}
+        leading_gates = [[] for _ in block_gates]  # 1Q gates added in front of each block, in reverse order
+        num_blocks = len(block_gates)
+        for idx in reversed(first_1q_gates):
+            if idx in next_gates:
+                i = gate_to_block[next_gates[idx]]
+            else:  # for wires on which there are only 1Q gates
+                i = len(block_gates)
+                block_gates.append([])
+                leading_gates.append([])
+            leading_gates[i].append(idx)
+            gate_to_block[idx] = i
+        block_order = list(range(len(block_gates) - 1, num_blocks - 1, -1)) + list(range(num_blocks))
+
+    assert sum(map(len, block_gates)) + len(first_1q_gates) == len(cc), "num_gates mismatch"
+    return [(leading_gates[i], block_gates[i]) for i in block_order]
+
+
+def _block_circuit(op: Callable[[int], cirq.Operation], leading_gates: Sequence[int],
+                   gates: Sequence[int]) -> cirq.Circuit:
+    """Circuit of a block from _reattach_1q_gates, op mapping indices of gates to operations"""
+    blk = cirq.Circuit([op(idx) for idx in gates])
+    for idx in leading_gates:
+        blk.insert(0, op(idx))
+    return blk
+
+
+def _select_blocks(frontier: passes.FrontLayer, masks: Sequence[int], nonlocal_flags: Sequence[int], max_weight: int,
+                   block_nodes: List[List[int]], first_touches: Dict[int, int] = None) -> List[List[int]]:
+    """
+    Select blocks greedily as seq_partition does until frontier is exhausted, appending them to block_nodes.
+    If first_touches is given, the epoch (index in block_nodes) at which each node is first consumed, speculatively
+    (i.e., in any candidate block) or not, is recorded into it.
+    """
+    while frontier:
+        block_candidates, scores = _grow_block_candidates(frontier, frontier.indices(), masks, nonlocal_flags,
+                                                          max_weight)
+        if first_touches is not None:
+            epoch = len(block_nodes)
+            for block in block_candidates:
+                for node in block:
+                    first_touches.setdefault(node, epoch)
+        block = block_candidates[np.argmax(scores)]
+        for node in block:
+            frontier.consume(node)
+        block_nodes.append(block)
+    return block_nodes
+
+
+@profiling.timed('partition.beam_partition')
+def beam_partition(circ: Union[cirq.Circuit, CompactCircuit], grain: int = 2, beam_width: int = 4,
+                   time_budget: float = None, return_report: bool = False,
+                   as_views: bool = False) -> Union[List[cirq.Circuit], List[BlockView], Tuple[list, dict]]:
+    """
+    Partition a circuit into grain-qubit blocks by beam search over sequences of candidate blocks.
+    ---
+    Candidate blocks are grown as in seq_partition. Rather than committing the best candidate of each epoch, the
+    beam_width best partial partitions (those covering the most nonlocal gates with the same number of blocks) are
+    kept, with partial partitions leaving the same gates uncovered merged. The search stops at the first epoch
+    where some partial partition covers the whole circuit. With beam_width=1 it reduces to seq_partition.
+    If time_budget (in seconds) runs out, the best partial partition is completed greedily. The result is never
+    worse than that of seq_partition, which is also run as the reference.
+    Complexity: O(w*m*n) for beam_width w, i.e., about w times that of seq_partition
+
+    Args:
+        circ: Input circuit (or CompactCircuit, see seq_partition)
+        grain: Maximum number of qubits of each block
+        beam_width: Number of partial partitions kept in each epoch
+        time_budget: Time limit in seconds, counted from the start of the call (None for no limit)
+        return_report: If True, also return a report with keys num_blocks, num_blocks_greedy, improvement
+            (blocks saved against seq_partition), time and budget_exhausted
+        as_views: If True, return blocks as BlockView instances (see seq_partition)
+
+    Returns:
+        Blocks (subcircuits) in topological order, as seq_partition does (and the report)
+    """
+    _check_grain(circ, grain)
+    if beam_width < 1:
+        raise ValueError("beam_width must be positive.")
+    start = time.perf_counter()
+    cc, first_1q_gates, order, successors = _prepare(circ)
+    masks = [cc.masks[idx] for idx in order]
+    nonlocal_flags = [int(cc.weights[idx] > 1) for idx in order]
+
+    with profiling.phase('partition.greedy'):
+        greedy_nodes = _select_blocks(passes.FrontLayer.from_successors(successors), masks, nonlocal_flags, grain, [])
+
+    # each state is (front layer, nodes of selected blocks, number of nonlocal gates covered), sorted by rank
+    beam = [(passes.FrontLayer.from_successors(successors), [], 0)]
+    budget_exhausted = False
+    with profiling.phase('partition.beam'):
+        while all(frontier for frontier, _, _ in beam):
+            if time_budget is not None and time.perf_counter() - start > time_budget:
+                budget_exhausted = True
                 break
+            profiling.count('partition.epochs')
+            children = []  # (number of nonlocal gates covered, rank of parent, candidate block)
+            for rank, (frontier, _, covered) in enumerate(beam):
+                candidates = frontier.indices()
+                profiling.count('partition.candidates', len(candidates))
+                block_candidates, scores = _grow_block_candidates(frontier, candidates, masks, nonlocal_flags, grain)
+                children.extend((covered + score, rank, block) for block, score in zip(block_candidates, scores))
+            children.sort(key=lambda child: -child[0])  # stable, thus ties are broken as in seq_partition
 
-    assert sum([circuits.num_gates(blk) for blk in blocks]) == circuits.num_gates(circ), "num_gates mismatch"
-    # console.print('num_gates of all blocks: {}'.format(sum([circuits.num_gates(blk) for blk in blocks])))
-    # console.print('num_gates: {}'.format(circuits.num_gates(circ)))
+            next_beam = []
+            visited = set()  # front layers of kept states, which determine the uncovered gates
+            for covered, rank, block in children:
+                frontier, block_nodes, _ = beam[rank]
+                mark = frontier.checkpoint()
+                for node in block:
+                    frontier.consume(node)
+                key = frozenset(frontier.ready)
+                if key not in visited:
+                    visited.add(key)
+                    next_beam.append((frontier.copy(), block_nodes + [block], covered))
+                frontier.rollback(mark)
+                if len(next_beam) == beam_width:
+                    break
+            beam = next_beam
 
-    # NOTE: in this algorithm we do not need to unify the blocks since they are already sorted
+    if budget_exhausted:
+        frontier, block_nodes, _ = beam[0]
+        block_nodes = _select_blocks(frontier, masks, nonlocal_flags, grain, list(block_nodes))
+    else:
+        block_nodes = next(block_nodes for frontier, block_nodes, _ in beam if not frontier)
+    if len(block_nodes) > len(greedy_nodes):
+        block_nodes = greedy_nodes
+
+    blocks = _assemble_blocks(cc, first_1q_gates, order, block_nodes, as_views)
+    if return_report:
+        report = {'num_blocks': len(blocks), 'num_blocks_greedy': len(blocks) - len(block_nodes) + len(greedy_nodes),
+                  'improvement': len(greedy_nodes) - len(block_nodes), 'time': time.perf_counter() - start,
+                  'budget_exhausted': budget_exhausted}
+        return blocks, report
     return blocks
 
 
-def _extend_block_over_dag(block: cirq.Circuit, dag: rx.PyDiGraph, max_weight: int) -> cirq.Circuit:
-    """Search applicable gates from the neighbors of block among this DAG to add them to block"""
-    block = block.copy()
+class IncrementalPartition:
+    """
+    Partition of a circuit into grain-qubit blocks (as seq_partition) maintained under appending operations and
+    replacing gates, e.g., for variational circuits changing from one iteration to the next.
+    ---
+    Gates are kept in the order they are given (ops), and blocks are always those of seq_partition(self.circuit),
+    where self.circuit is built by cirq's EARLIEST insertion strategy, i.e., cirq.Circuit(ops).
+    The DAG of seq_partition is maintained in place: 1Q gates preceding the first multi-qubit gate of their wires are
+    peeled, and other gates are nodes keyed by (layer after peeling, layer, gate), which sorts front layers as the
+    node indices of seq_partition do. A single FrontLayer is kept, whose checkpoint at each epoch (block selection)
+    is the number of nodes committed before it, and the epoch at which each node is first consumed by any candidate
+    block is recorded.
+    A node cannot join the front layer before all of its predecessors are consumed, thus on appending gates (or
+    replacing a gate by one on other qubits, which rebuilds the gates after it and changes the nodes depending on
+    it), the frontier is rolled back to the earliest epoch at which a changed node might join it, and only the
+    following epochs are searched again. Replacing a gate by one on the same qubits keeps the DAG, thus only the
+    block containing it is rebuilt. Blocks are materialized once and reused while their gates are unchanged.
+    Complexity: O(k + e) to update for k rebuilt gates and e epochs searched again, the latter dominating
 
-    if not dag.num_nodes():
-        return block
+    Usage:
+        part = IncrementalPartition(circ, grain=3)
+        part.append(layer_ops)
+        part.replace(gate_idx, new_op)
+        blocks = part.blocks
+    """
 
-    while front_layer := passes.obtain_front_layer(dag):
-        optional_gates = _sort_gates_on_ref_qubits(front_layer, block.all_qubits())
-        if len(block.all_qubits() | set(optional_gates[0].qubits)) > max_weight:
-            break
-        for g in optional_gates:
-            if len(block.all_qubits() | set(g.qubits)) <= max_weight:
-                block.append(g)
-                dag.remove_node(node_index(dag, g))
+    def __init__(self, circ: Union[cirq.Circuit, Iterable[cirq.Operation]] = (), grain: int = 2):
+        if grain <= 1:
+            raise ValueError("grain must be greater than 1.")
+        self.grain = grain
+        self.ops = []
+        self._wires = {}  # qubit -> (its last layer, its last layer after peeling, its last node or None)
+        self._chains = {}  # qubit -> peeled 1Q gates on it
+        self._records = []  # each gate -> (qubits, previous states of its wires, node, predecessors, peeled chains)
+        self._bits = {}  # qubit -> its bit in masks
+        self._masks = {}  # node -> bitmask of its qubits
+        self._nonlocal_flags = {}  # node -> 1 for nonlocal gates
+        self._frontier = passes.FrontLayer.from_successors({})
+        self._block_nodes = []  # nodes of the block selected at each epoch
+        self._first_touches = {}  # node -> epoch at which it is first consumed by a candidate block, in epoch order
+        self._wire_blocks = []  # blocks of wires on which there are only 1Q gates, see _reattach_1q_gates
+        self._layout = []  # the block selected at each epoch as a pair of tuples of gates, see _reattach_1q_gates
+        self._gate_to_block = {}  # gate -> its block in self._wire_blocks or self._layout
+        self._materialized = {}  # block in self._wire_blocks or self._layout -> circuit
+        self.append(circ)
+
+    def __len__(self) -> int:
+        """Number of blocks"""
+        return len(self._wire_blocks) + len(self._layout)
+
+    @property
+    def blocks(self) -> List[cirq.Circuit]:
+        """Blocks (subcircuits) in topological order, which are shared with later states and should not be mutated"""
+        return [self._materialized[key] for key in self._wire_blocks + self._layout]
+
+    @property
+    def circuit(self) -> cirq.Circuit:
+        return cirq.Circuit(self.ops)
+
+    def append(self, ops: Union[cirq.Circuit, Iterable[cirq.Operation]]):
+        """Append operations (in topological order) to the circuit and update blocks"""
+        ops = list(ops.all_operations() if isinstance(ops, cirq.Circuit) else ops)
+        if not ops:
+            return
+        if max([len(op.qubits) for op in ops]) > self.grain:
+            raise ValueError("grain must be no less than the maximum gate weight of the circuit.")
+        num_old = len(self.ops)
+        self.ops.extend(ops)
+        self._update(num_old)
+
+    def replace(self, gate_idx: int, op: cirq.Operation):
+        """Replace the gate_idx-th operation (in the order given, negative indices counting from the end) by op"""
+        gate_idx = range(len(self.ops))[gate_idx]  # raises IndexError before any mutation
+        if len(op.qubits) > self.grain:
+            raise ValueError("grain must be no less than the maximum gate weight of the circuit.")
+        same_qubits = set(op.qubits) == set(self.ops[gate_idx].qubits)
+        self.ops[gate_idx] = op
+        key = self._gate_to_block[gate_idx]
+        self._materialized[key] = _block_circuit(self.ops.__getitem__, *key)
+        if not same_qubits:
+            self._update(gate_idx)
+
+    def _update(self, num_kept: int):
+        """Update blocks after gates from num_kept on are appended or replaced"""
+        old_records = self._records[num_kept:]
+        for _ in old_records:
+            self._unrecord()
+        for idx in range(num_kept, len(self.ops)):
+            self._record(idx)
+
+        # changed nodes (in qubits, key, predecessors or peeled chains) are removed with their descendants and added back
+        removed, added = [], []
+        removed_nodes = set()
+        for old, new in zip_longest(old_records, self._records[num_kept:]):
+            changed = old is None or new is None or old[0] != new[0] or old[2:] != new[2:]
+            if old is not None and old[2] is not None and (changed or not removed_nodes.isdisjoint(old[3])):
+                removed.append(old)
+                removed_nodes.add(old[2])
+            if new is not None and new[2] is not None and (changed or new[2] in removed_nodes):
+                added.append(new)
+
+        # a node cannot join the front layer before the epoch at which all of its predecessors were consumed by
+        # candidate blocks, and those with added predecessors are bounded by the latter
+        first_touches = self._first_touches
+        bounds = [max([first_touches[pred] for pred in preds], default=0) for _, _, _, preds, _ in removed]
+        added_bounds = {}
+        for _, _, node, preds, _ in added:
+            added_bounds[node] = max([added_bounds[pred] if pred in added_bounds else first_touches[pred]
+                                      for pred in preds], default=0)
+        start = min(bounds + list(added_bounds.values()), default=len(self._block_nodes))
+
+        frontier = self._frontier
+        frontier.rollback(len(frontier.consumed) - sum(map(len, self._block_nodes[start:])))
+        del self._block_nodes[start:]
+        while first_touches and next(reversed(first_touches.values())) >= start:
+            first_touches.popitem()
+        for _, _, node, preds, _ in reversed(removed):
+            frontier.remove_node(node, preds)
+            del self._masks[node], self._nonlocal_flags[node]
+        for qubits, _, node, preds, _ in added:
+            frontier.add_node(node, preds)
+            self._masks[node] = sum(1 << self._bits.setdefault(q, len(self._bits)) for q in qubits)
+            self._nonlocal_flags[node] = int(len(qubits) > 1)
+        with profiling.phase('partition.grow'):
+            _select_blocks(frontier, self._masks, self._nonlocal_flags, self.grain, self._block_nodes, first_touches)
+        self._relayout(start)
+
+    def _record(self, idx: int):
+        """Add the idx-th gate to the DAG bookkeeping of wires, either peeling it or keying its node"""
+        qubits = self.ops[idx].qubits
+        prev_states = [self._wires.get(q) for q in qubits]
+        states = [state or (-1, -1, None) for state in prev_states]
+        layer = max([state[0] for state in states]) + 1
+        if len(qubits) == 1 and states[0][2] is None:  # no node on its wire yet
+            self._chains.setdefault(qubits[0], []).append(idx)
+            self._wires[qubits[0]] = (layer, -1, None)
+            self._records.append((qubits, prev_states, None, (), ()))
+            return
+        peeled_layer = max([state[1] for state in states]) + 1
+        node = (peeled_layer << 2 * _key_bits) | (layer << _key_bits) | idx
+        preds = tuple(sorted({state[2] for state in states if state[2] is not None}))
+        chains = tuple(tuple(self._chains.get(q, ())) for q, state in zip(qubits, states) if state[2] is None)
+        for q in qubits:
+            self._wires[q] = (layer, peeled_layer, node)
+        self._records.append((qubits, prev_states, node, preds, chains))
+
+    def _unrecord(self):
+        """Remove the last gate from the DAG bookkeeping of wires"""
+        qubits, prev_states, node, _, _ = self._records.pop()
+        for q, state in zip(qubits, prev_states):
+            if state is None:
+                del self._wires[q]
             else:
+                self._wires[q] = state
+        if node is None:
+            chain = self._chains[qubits[0]]
+            chain.pop()
+            if not chain:
+                del self._chains[qubits[0]]
+
+    def _relayout(self, start: int):
+        """Lay out blocks selected from epoch start on (and blocks of wires with only 1Q gates) with peeled gates"""
+        stale = {key: self._materialized.pop(key) for key in self._wire_blocks + self._layout[start:]}
+        del self._layout[start:]
+        chains = sorted((chain for q, chain in self._chains.items() if self._wires[q][2] is None),
+                        key=lambda chain: (len(chain), chain[-1]))
+        self._wire_blocks = [(tuple(reversed(chain)), ()) for chain in chains]
+        for block in self._block_nodes[start:]:
+            gates = tuple(node & _gate_mask for node in block)
+            leading_gates = sorted(((layer, g) for idx in gates for chain in self._records[idx][4]
+                                    for layer, g in enumerate(chain)), reverse=True)
+            self._layout.append((tuple(g for _, g in leading_gates), gates))
+        for key in self._wire_blocks + self._layout[start:]:
+            self._materialized[key] = stale[key] if key in stale else _block_circuit(self.ops.__getitem__, *key)
+            self._gate_to_block.update(dict.fromkeys(key[0] + key[1], key))
+
+
+_key_bits = 32  # width of each field of node keys of IncrementalPartition
+_gate_mask = (1 << _key_bits) - 1
+
+
+def stream_partition(ops: Iterable[cirq.Operation], grain: int = 2, window: int = 4096) -> Iterator[cirq.Circuit]:
+    """
+    Partition a stream of operations into groups of grain-qubit blocks, yielding each block as soon as it is closed.
+    ---
+    Operations are consumed lazily (e.g., straight from a QASM reader) into a lookahead window of at most `window`
+    pending gates, whose DAG is maintained incrementally. Whenever the window is full (or the stream is exhausted),
+    a block is selected among the pending gates by the same greedy rule as seq_partition and yielded. Hence peak
+    memory is bounded by the window (plus 1Q gates leading the wires) rather than by the circuit size, while
+    blocks might be smaller than those of seq_partition near the boundary of the window.
+    As in seq_partition, 1Q gates leading the wires are held aside and inserted to the blocks of their successors.
+
+    Args:
+        ops: Operations in topological order
+        grain: Maximum number of qubits of each block
+        window: Maximum number of pending gates
+
+    Returns:
+        An iterator of blocks (subcircuits) in topological order
+    """
+    if grain <= 1:
+        raise ValueError("grain must be greater than 1.")
+    if window < 1:
+        raise ValueError("window must be positive.")
+
+    ops = iter(ops)
+    frontier = passes.FrontLayer.from_successors({})
+    node_ops, masks, nonlocal_flags = {}, {}, {}  # data of pending gates
+    nodes = count()
+    qubit_index = {}
+    last_writers = {}  # qubit -> the last pending gate acting on it
+    held_1q_gates = {}  # qubit -> 1Q gates leading the wire
+    opened = set()  # qubits on which some multi-qubit gate has arrived
+    exhausted = False
+    while True:
+        while not exhausted and len(frontier) < window:
+            op = next(ops, None)
+            if op is None:
+                exhausted = True
                 break
+            qubits = [qubit_index.setdefault(q, len(qubit_index)) for q in op.qubits]
+            if len(qubits) > grain:
+                raise ValueError("grain must be no less than the maximum gate weight of the circuit.")
+            if len(qubits) == 1 and qubits[0] not in opened:
+                held_1q_gates.setdefault(qubits[0], []).append(op)
+                continue
+            opened.update(qubits)
+            node = next(nodes)
+            frontier.add_node(node, {last_writers[q] for q in qubits if q in last_writers})
+            node_ops[node], masks[node], nonlocal_flags[node] = op, sum(1 << q for q in qubits), int(len(qubits) > 1)
+            for q in qubits:
+                last_writers[q] = node
+        if not frontier:
+            break
 
-    return block
+        candidates = frontier.indices()
+        profiling.count('partition.epochs')
+        profiling.count('partition.candidates', len(candidates))
+        with profiling.phase('partition.grow'):
+            block_candidates, scores = _grow_block_candidates(frontier, candidates, masks, nonlocal_flags, grain)
+        block = block_candidates[np.argmax(scores)]  # the selected extended block
+        profiling.count('partition.gates_absorbed', len(block))
+        for node in block:
+            frontier.consume(node)
+        frontier.release()
+
+        blk = cirq.Circuit([node_ops.pop(node) for node in block])
+        mask = 0
+        for node in block:
+            mask |= masks.pop(node)
+            del nonlocal_flags[node]
+        for q in [q for q in range(mask.bit_length()) if mask >> q & 1]:
+            if last_writers.get(q) in block:
+                del last_writers[q]
+            for g in reversed(held_1q_gates.pop(q, [])):
+                blk.insert(0, g)
+        yield blk
 
+    for ops_1q in held_1q_gates.values():  # wires on which there are only 1Q gates
+        yield cirq.Circuit(ops_1q)
 
-def _sort_gates_on_ref_qubits(gates: List[cirq.GateOperation], ref_qubits: Union[List[int], Set[int]]) -> List[cirq.GateOperation]:
+
+def _num_first_layer(cc: CompactCircuit) -> int:
+    """Number of gates in the first moment, for gates in the order of moments of the EARLIEST insertion strategy"""
+    touched = 0
+    for idx, mask in enumerate(cc.masks):
+        if mask & touched:
+            return idx
+        touched |= mask
+    return len(cc)
+
+
+def _peel_first_layer_1q_gates(cc: CompactCircuit, num_first_layer: int) -> Tuple[List[int], List[int]]:
     """
-    Sort the gates according to the number of qubits overlapped and additional overhead with the given set of qubits
-    Sort by: 1) additional overhead (ascending); 2) number of qubits overlapped (descending)
+    Repeatedly peel 1Q gates from the first layer, where the circuit is rebuilt (in the way of cirq's EARLIEST
+    insertion strategy) after each round of peeling.
+
+    Args:
+        cc: The compact circuit
+        num_first_layer: Number of gates in the first layer (moment) of the original circuit
+
+    Returns:
+        Peeled 1Q gates in peeling order, and the remaining gates in the order of the rebuilt circuit
     """
-    return sorted(gates, key=lambda g: (len(set(g.qubits) - set(ref_qubits)),
-                                        - len(set(g.qubits) & set(ref_qubits))))
+    qubits = cc.qubits.tolist()
+    weights = cc.weights.tolist()
+    order = list(range(len(cc)))
+    first_layer = order[:num_first_layer]
+    peeled = []
+    while first_layer_1q := [idx for idx in first_layer if weights[idx] == 1]:
+        peeled.extend(first_layer_1q)
+        first_layer_1q = set(first_layer_1q)
+        order = [idx for idx in order if idx not in first_layer_1q]
+        layers = {}
+        last_layers = {}  # qubit -> the last layer acting on it
+        for idx in order:
+            layer = max([last_layers.get(q, -1) for q in qubits[idx][:weights[idx]]], default=-1) + 1
+            for q in qubits[idx][:weights[idx]]:
+                last_layers[q] = layer
+            layers[idx] = layer
+        order.sort(key=layers.__getitem__)
+        first_layer = [idx for idx in order if layers[idx] == 0]
+    return peeled, order
 
 
+def _next_gates_on_wires(cc: CompactCircuit, gates_1q: Sequence[int]) -> dict:
+    """Map each of the given 1Q gates to the next gate on its wire (if any)"""
+    qubits = cc.qubits.tolist()
+    weights = cc.weights.tolist()
+    gates_1q = set(gates_1q)
+    successors = {}
+    last_gates = {}  # qubit -> the last gate acting on it
+    for idx in range(len(cc)):
+        for q in qubits[idx][:weights[idx]]:
+            if last_gates.get(q) in gates_1q:
+                successors[last_gates[q]] = idx
+            last_gates[q] = idx
+    return successors
+
+
+def _grow_block_candidates(frontier: passes.FrontLayer, candidates: Sequence[int], masks: Sequence[int],
+                           nonlocal_flags: Sequence[int], max_weight: int,
+                           lookahead: int = 0) -> Tuple[List[List[int]], List[int]]:
+    """
+    Grow a candidate block from each of the candidate front nodes speculatively, returning nodes of each block
+    and its score, i.e., the number of nonlocal gates counted while growing (nonlocal_flags[g] is 1 for them).
+    With lookahead k > 0, the score also adds scores of the next k blocks selected greedily after the candidate.
+    """
+    block_candidates = []
+    scores = []
+    for node in candidates:
+        mark = frontier.checkpoint()
+        frontier.consume(node)
+        score = nonlocal_flags[node] + _extend_block(masks[node], masks, nonlocal_flags, max_weight, frontier)[1]
+        if lookahead:
+            block = frontier.consumed[mark:]
+            for _ in range(lookahead):
+                if not frontier:
+                    break
+                next_blocks, next_scores = _grow_block_candidates(frontier, frontier.indices(), masks, nonlocal_flags,
+                                                                  max_weight)
+                best = int(np.argmax(next_scores))
+                for g in next_blocks[best]:
+                    frontier.consume(g)
+                score += next_scores[best]
+            frontier.rollback(mark)
+        else:
+            block = frontier.rollback(mark)
+        block_candidates.append(block)
+        scores.append(score)
+    profiling.count('partition.nodes_explored', sum(map(len, block_candidates)))
+    return block_candidates, scores
+
+
+_worker_state = {}  # state of the partitioning worker process, see _init_worker
+
+
+def _init_worker(successors: List[List[int]], masks: List[int], nonlocal_flags: List[int], max_weight: int,
+                 lookahead: int):
+    """Initialize a worker process with the static snapshot of the (compact) DAG"""
+    _worker_state.update(frontier=passes.FrontLayer.from_successors(successors), masks=masks,
+                         nonlocal_flags=nonlocal_flags, max_weight=max_weight, lookahead=lookahead)
+
+
+def _grow_block_candidates_in_worker(offset: int, committed: np.ndarray,
+                                     candidates: List[int]) -> Tuple[int, int, List[List[int]], List[int]]:
+    """
+    Catch up with nodes committed in the main process (committed[i] is the (offset+i)-th committed node),
+    then grow the candidate blocks; the worker pid and the number of committed nodes are returned as well
+    """
+    frontier = _worker_state['frontier']
+    for node in committed[len(frontier.consumed) - offset:].tolist():
+        frontier.consume(node)
+    block_candidates, scores = _grow_block_candidates(frontier, candidates, _worker_state['masks'],
+                                                      _worker_state['nonlocal_flags'], _worker_state['max_weight'],
+                                                      _worker_state['lookahead'])
+    return os.getpid(), len(frontier.consumed), block_candidates, scores
 
-def _block_score(block: Union[List[cirq.GateOperation], cirq.Circuit, List[cirq.Circuit]], init_score: float = 0) -> float:
-    if isinstance(block, cirq.Circuit):
-        circ = block
-    elif isinstance(block, list) and isinstance(block[0], cirq.GateOperation):
-        circ = cirq.Circuit(block)
-    elif isinstance(block, list) and isinstance(block[0], cirq.Circuit):
-        circ = reduce(add, block)
-    else:
-        raise ValueError('Invalid type of block.')
 
-    # score_local = 0.1 * (circuits.num_gates(circ) - circuits.num_nonlocal_gates(circ))
-    score_nl = circuits.num_nonlocal_gates(circ)  # the number of nonlocal gates contributes the most
-    # return init_score + score_nl + 0.1 * score_local
-    return score_nl
+def _extend_block(mask: int, masks: Sequence[int], nonlocal_flags: Sequence[int], max_weight: int,
+                  frontier: passes.FrontLayer) -> Tuple[int, int]:
+    """
+    Search applicable gates from the front layer of the remaining DAG to add them to the block (qubit bitmask)
+    Gates added to the block are consumed from frontier; the extended bitmask and the number of nonlocal gates
+    added are returned
+    """
+    num_nonlocal = 0
+    while front_layer := frontier.indices():
+        optional_gates = _sort_gates_on_ref_qubits(front_layer, mask, masks)
+        if popcount(mask | masks[optional_gates[0]]) > max_weight:
+            break
+        for g in optional_gates:
+            if popcount(mask | masks[g]) <= max_weight:
+                mask |= masks[g]
+                num_nonlocal += nonlocal_flags[g]
+                frontier.consume(g)
+            else:
+                break
+
+    return mask, num_nonlocal
+
+
+def _sort_gates_on_ref_qubits(gates: List[int], ref_mask: int, masks: Sequence[int]) -> List[int]:
+    """
+    Sort the gates according to the number of qubits overlapped and additional overhead with the given set of qubits
+    Sort by: 1) additional overhead (ascending); 2) number of qubits overlapped (descending)
+    Gates are indices into masks, and qubit sets are bitmasks
+    """
+    return sorted(gates, key=lambda g: (popcount(masks[g] & ~ref_mask),
+                                        - popcount(masks[g] & ref_mask)))
@@ -1,58 +1,235 @@
+import heapq
 import rustworkx as rx
 import cirq
-from typing import Union, List, Tuple
+from typing import Union, List, Tuple, Dict, Iterable
 
-from .graphs import node_index, find_predecessors_by_node, find_successors_by_node
+from .circuits import circuit_to_dag
+from .unitaries import block_unitaries
+from . import profiling
 
 
+class FrontLayer:
+    """
+    Incrementally maintained front layer (nodes with in_degree == 0) of a DAG.
+    ---
+    Nodes are consumed instead of being removed from the DAG: consuming a node decrements the in-degree counters
+    of its successors, and those whose counter drops to 0 join the front layer. Only the adjacency of the DAG is
+    kept, thus the DAG itself is never mutated.
+    Consumed nodes are logged in order, so that speculative consumption (e.g., growing a candidate block) can be
+    undone by rollback() to a checkpoint() without copying any state.
+    Complexity: O(n+e) to construct, O(d) to consume a node with d successors, O(log k) to pop the front node
+    """
+
+    def __init__(self, dag: rx.PyDiGraph):
+        self._init({idx: list(dag.successor_indices(idx)) for idx in dag.node_indices()})
+
+    @classmethod
+    def from_successors(cls, successors: Union[Dict[int, List[int]], List[List[int]]]) -> 'FrontLayer':
+        """Build the front layer from successor lists of a DAG (e.g., CompactCircuit.successors) instead of a DAG"""
+        frontier = cls.__new__(cls)
+        frontier._init(successors if isinstance(successors, dict) else dict(enumerate(successors)))
+        return frontier
+
+    def _init(self, successors: Dict[int, List[int]]):
+        self.successors = successors
+        self.in_degree = dict.fromkeys(self.successors, 0)
+        for succs in self.successors.values():
+            for succ in succs:
+                self.in_degree[succ] += 1
+        self.ready = {idx for idx, degree in self.in_degree.items() if degree == 0}
+        self.num_remaining = len(self.in_degree)
+        self.consumed = []  # undo log
+        self._heap = sorted(self.ready)  # min-heap of front nodes, lazily cleaned up against self.ready
+
+    def __len__(self) -> int:
+        """Number of nodes not consumed yet"""
+        return self.num_remaining
+
+    def __contains__(self, idx: int) -> bool:
+        """Whether the node is in the front layer"""
+        return idx in self.ready
+
+    def indices(self) -> List[int]:
+        """Indices of nodes in the front layer, in ascending order"""
+        return sorted(self.ready)
+
+    def peek(self) -> int:
+        """Index of the front node with the smallest index"""
+        if len(self._heap) > 2 * len(self.ready) + 16:  # too many stale entries left by rollbacks
+            self._heap = sorted(self.ready)
+        while self._heap[0] not in self.ready:
+            heapq.heappop(self._heap)
+        return self._heap[0]
+
+    def pop(self) -> int:
+        """Consume the front node with the smallest index and return its index"""
+        idx = self.peek()
+        self.consume(idx)
+        return idx
+
+    def consume(self, idx: int):
+        """Consume a node of the front layer, as if it was removed from the DAG"""
+        self.ready.remove(idx)
+        self.num_remaining -= 1
+        self.consumed.append(idx)
+        for succ in self.successors[idx]:
+            self.in_degree[succ] -= 1
+            if self.in_degree[succ] == 0:
+                self.ready.add(succ)
+                heapq.heappush(self._heap, succ)
+
+    def add_node(self, idx: int, predecessors: Iterable[int]):
+        """
+        Add a node depending on the given predecessors, e.g., for a DAG growing with a gate stream.
+        Predecessors consumed already (but still in the undo log) are not counted, and rollback() counts them back.
+        """
+        self.successors[idx] = []
+        self.in_degree[idx] = 0
+        for pred in predecessors:
+            self.successors[pred].append(idx)
+            if self.in_degree[pred] or pred in self.ready:  # not consumed
+                self.in_degree[idx] += 1
+        self.num_remaining += 1
+        if self.in_degree[idx] == 0:
+            self.ready.add(idx)
+            heapq.heappush(self._heap, idx)
+
+    def remove_node(self, idx: int, predecessors: Iterable[int]):
+        """Remove an unconsumed node without successors, given its predecessors, i.e., undo add_node"""
+        for pred in predecessors:
+            self.successors[pred].remove(idx)
+        self.ready.discard(idx)
+        del self.successors[idx]
+        del self.in_degree[idx]
+        self.num_remaining -= 1
+
+    def release(self):
+        """Drop consumed nodes and clear the undo log to bound memory, which invalidates previous checkpoints"""
+        for idx in self.consumed:
+            del self.successors[idx]
+            del self.in_degree[idx]
+        self.consumed.clear()
+
+    def checkpoint(self) -> int:
+        """Mark the current state, to which rollback() can return"""
+        return len(self.consumed)
+
+    def rollback(self, mark: int) -> List[int]:
+        """Undo consumption of nodes after the checkpoint mark, returning their indices in consumption order"""
+        undone = self.consumed[mark:]
+        for idx in reversed(undone):
+            for succ in self.successors[idx]:
+                if self.in_degree[succ] == 0:
+                    self.ready.discard(succ)
+                self.in_degree[succ] += 1
+            self.ready.add(idx)
+            heapq.heappush(self._heap, idx)
+        self.num_remaining += len(undone)
+        del self.consumed[mark:]
+        return undone
+
+    def copy(self) -> 'FrontLayer':
+        """Copy the counters and the front layer, sharing the (immutable) adjacency"""
+        profiling.count('passes.frontier_copies')
+        frontier = FrontLayer.__new__(FrontLayer)
+        frontier.successors = self.successors
+        frontier.in_degree = self.in_degree.copy()
+        frontier.ready = self.ready.copy()
+        frontier.num_remaining = self.num_remaining
+        frontier.consumed = self.consumed.copy()
+        frontier._heap = self._heap.copy()
+        return frontier
+
+
+@profiling.timed('passes.obtain_front_layer')
 def obtain_front_layer(dag_or_circ: Union[cirq.Circuit, rx.PyDiGraph],
                        return_indices: bool = False) -> Union[
     List[Union[cirq.GateOperation, cirq.Circuit]], Tuple[List[Union[cirq.GateOperation, cirq.Circuit]], List[int]]]:
     """
     Obtain front layer (with in_degree == 0) of the DAG.
     Since the node of DAG might be Gate instance or Circuit instance, result is a list of Gate or Circuit.
+    ---
+    For repeated queries while consuming nodes, use FrontLayer instead.
     """
     if isinstance(dag_or_circ, cirq.Circuit):
-        dag = dag_or_circ.to_dag()
+        dag = circuit_to_dag(dag_or_circ)
     else:
         dag = dag_or_circ
-    front_layer = []
-    front_layer_indices = []
-    for node_idx in dag.node_indices():
-        if dag.in_degree(node_idx) == 0:
-            front_layer.append(dag[node_idx])
-            front_layer_indices.append(node_idx)
+    front_layer_indices = FrontLayer(dag).indices()
+    front_layer = [dag[idx] for idx in front_layer_indices]
     if return_indices:
         return front_layer, front_layer_indices
     return front_layer
 
 
-def contract_1q_gates_on_dag(dag: rx.PyDiGraph) -> rx.PyDiGraph:
+@profiling.timed('passes.contract_1q_gates_on_dag')
+def contract_1q_gates_on_dag(dag: rx.PyDiGraph, fuse: bool = False) -> rx.PyDiGraph:
     """
     Aggregate all 1Q gates into neighboring 2Q gates
     After this pass, each node in DAG is a 2Q block (Circuit instance), including only one 2Q gate
+    ---
+    A run of 1Q gates on a wire is absorbed by the 2Q gate right before it on that wire, otherwise by the 2Q gate
+    right after it; runs without any neighboring 2Q gate (e.g., next to 3Q gates) are left as they are.
+    Runs are assigned in one sweep over the topological order, and the contracted DAG is built directly.
+    Complexity: O(n+e), n is the number of nodes and e is the number of edges
+
+    Args:
+        dag: DAG whose nodes are gates (or blocks, which are left as they are)
+        fuse: If True, each block is fused into a single operation of its unitary (cirq.MatrixGate)
+
+    Returns:
+        The contracted DAG
     """
-    dag = dag.copy()
-    nodes_2q_gate = [node for node in dag.nodes() if isinstance(node, cirq.GateOperation) and cirq.num_qubits(node) == 2]
-
-    for g in nodes_2q_gate:
-        block = cirq.Circuit([g])
-        dag[node_index(dag, g)] = block
-        while True:
-            predecessors_1q = find_predecessors_by_node(dag, node_index(dag, block),
-                                                        lambda node: isinstance(node, cirq.GateOperation) and cirq.num_qubits(node) == 1)
-            successors_1q = find_successors_by_node(dag, node_index(dag, block),
-                                                    lambda node: isinstance(node, cirq.GateOperation) and cirq.num_qubits(node) == 1)
-            if not predecessors_1q and not successors_1q:  # there is no 1Q gate in the neighborhood
-                break
-            for g_pred in predecessors_1q:
-                block.insert(0, g_pred)
-                dag.contract_nodes([node_index(dag, block), node_index(dag, g_pred)], block)
-            for g_succ in successors_1q:
-                block.append(g_succ)
-                dag.contract_nodes([node_index(dag, block), node_index(dag, g_succ)], block)
-
-    return dag
+    def is_gate(node, num_qubits):
+        return isinstance(node, cirq.GateOperation) and cirq.num_qubits(node) == num_qubits
+
+    order = rx.topological_sort(dag)
+    units = {}  # node index -> index of the 2Q gate absorbing it (or itself)
+    runs_1q = {}  # qubit -> 1Q gates on the wire not assigned yet
+    last_gates = {}  # qubit -> the last multi-qubit node on the wire
+    for idx in order:
+        node = dag[idx]
+        if is_gate(node, 1):
+            q = node.qubits[0]
+            if q in last_gates and is_gate(dag[last_gates[q]], 2):
+                units[idx] = last_gates[q]
+            else:
+                runs_1q.setdefault(q, []).append(idx)
+            continue
+        units[idx] = idx
+        for q in _node_qubits(node):
+            for idx_1q in runs_1q.pop(q, []):
+                units[idx_1q] = idx if is_gate(node, 2) else idx_1q
+            last_gates[q] = idx
+    for run in runs_1q.values():
+        for idx_1q in run:
+            units[idx_1q] = idx_1q
+
+    members = {}  # unit -> node indices in topological order
+    for idx in order:
+        members.setdefault(units[idx], []).append(idx)
+    blocks = {unit: cirq.Circuit([dag[idx] for idx in indices]) for unit, indices in members.items()
+              if is_gate(dag[unit], 2)}
+    if fuse:
+        blocks = {unit: cirq.MatrixGate(u).on(*sorted(blk.all_qubits()))
+                  for (unit, blk), u in zip(blocks.items(), block_unitaries(list(blocks.values())))}
 
+    dag_contracted = rx.PyDiGraph(multigraph=False)
+    new_indices = {unit: dag_contracted.add_node(blocks.get(unit, dag[unit])) for unit in members}
+    edges = {}  # (src, dst) -> dependent qubits
+    last_units = {}  # qubit -> the last unit on the wire
+    for idx in order:
+        unit = units[idx]
+        for q in _node_qubits(dag[idx]):
+            if q in last_units and last_units[q] != unit:
+                edges.setdefault((new_indices[last_units[q]], new_indices[unit]), []).append(q)
+            last_units[q] = unit
+    dag_contracted.add_edges_from([(src, dst, {'qubits': qubits}) for (src, dst), qubits in sorted(edges.items())])
+    return dag_contracted
 
 
+def _node_qubits(node: Union[cirq.Operation, cirq.Circuit]) -> List[cirq.Qid]:
+    """Qubits of a DAG node, which is either a gate or a block"""
+    if isinstance(node, cirq.Circuit):
+        return sorted(node.all_qubits())
+    return list(node.qubits)
@@ -0,0 +1,181 @@
+"""
+Quasi-probability (PEC) representations of partitioned blocks
+"""
+import cirq
+import numpy as np
+from itertools import product, chain
+from functools import lru_cache
+from typing import List, Sequence, Tuple, Iterator
+
+from .unitaries import block_key
+from .utils import inv_depolarizing_channel_rate
+
+PAULIS_1Q = (cirq.I, cirq.X, cirq.Y, cirq.Z)
+
+
+@lru_cache(maxsize=None)
+def pauli_basis(num_qubits: int) -> List[Tuple[cirq.Gate, ...]]:
+    """Pauli strings (I, X, Y, Z on each qubit) of the representation basis, the identity being the first"""
+    return list(product(PAULIS_1Q, repeat=num_qubits))
+
+
+def global_depolarizing_coeffs(noise_levels: np.ndarray, num_qubits: int) -> np.ndarray:
+    """
+    Quasi-probabilities of an ideal n-qubit operation U in terms of noisy operations D o P o U (P in pauli_basis),
+    where D is the global depolarizing channel, e.g., cirq.depolarize(p, n), of each noise level p.
+    ---
+    The inverse channel of D is (1 + r) I - r / (4^n - 1) * sum_{P != I} P, with r = inv_depolarizing_channel_rate(p, n),
+    which is the same as mitiq's represent_operation_with_global_depolarizing_noise.
+
+    Returns:
+        Coefficients of shape (len(noise_levels), 4^n)
+    """
+    noise_levels = np.asarray(noise_levels, dtype=float)
+    if np.any(noise_levels >= 1 - 1 / 4 ** num_qubits) or np.any(noise_levels < 0):
+        raise ValueError('noise levels must be in [0, 1 - 1 / 4^n) for the inverse channel to exist.')
+    rates = inv_depolarizing_channel_rate(noise_levels, num_qubits)
+    coeffs = np.empty((len(noise_levels), 4 ** num_qubits))
+    coeffs[:, 0] = 1 + rates
+    coeffs[:, 1:] = (- rates / (4 ** num_qubits - 1))[:, None]
+    return coeffs
+
+
+class BlockRepresentations:
+    """
+    Quasi-probability representations of blocks (e.g., from seq_partition) for a vector of noise levels.
+    ---
+    The ideal block U (on k qubits) is represented by noisy operations D o P o U, where P runs over pauli_basis(k) and
+    D is the global depolarizing channel on the block. Coefficients only depend on the number of qubits of blocks, so
+    they are computed once per block size for all noise levels in a vectorized manner; structurally identical blocks
+    (same block_key) are further grouped into classes for downstream reuse.
+
+    Attributes:
+        blocks: The ideal blocks
+        noise_levels: Noise levels of shape (R,)
+        num_qubits: Number of qubits of each block, of shape (B,)
+        coeffs: Dict from number of qubits k to coefficients of shape (R, 4^k)
+        gammas: One-norms of representations, of shape (R, B)
+        classes: Index of the structural class of each block, of shape (B,)
+    """
+
+    def __init__(self, blocks: Sequence[cirq.Circuit], noise_levels: Sequence[float]):
+        self.blocks = list(blocks)
+        self.noise_levels = np.atleast_1d(np.asarray(noise_levels, dtype=float))
+        self.num_qubits = np.array([len(blk.all_qubits()) for blk in self.blocks], dtype=int)
+        self.coeffs = {int(k): global_depolarizing_coeffs(self.noise_levels, k) for k in np.unique(self.num_qubits)}
+        self.gammas = np.zeros((len(self.noise_levels), len(self.blocks)))
+        for k, coeffs in self.coeffs.items():
+            self.gammas[:, self.num_qubits == k] = np.abs(coeffs).sum(axis=1)[:, None]
+        class_ids = {}
+        self.classes = np.array([class_ids.setdefault(block_key(blk), len(class_ids)) for blk in self.blocks], dtype=int)
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    @property
+    def total_gammas(self) -> np.ndarray:
+        """One-norms of the representation of the whole circuit, of shape (R,)"""
+        return np.prod(self.gammas, axis=1)
+
+    def block_coeffs(self, idx: int) -> np.ndarray:
+        """Coefficients of the idx-th block, of shape (R, 4^k)"""
+        return self.coeffs[int(self.num_qubits[idx])]
+
+    def noisy_operation(self, idx: int, alpha: int) -> cirq.Circuit:
+        """The idx-th block followed by the alpha-th Pauli string on its (sorted) qubits"""
+        blk = self.blocks[idx]
+        paulis = pauli_basis(int(self.num_qubits[idx]))[alpha]
+        return blk + cirq.Circuit([p.on(q) for p, q in zip(paulis, sorted(blk.all_qubits())) if p != cirq.I])
+
+    def sampled_circuit(self, config: Sequence[int]) -> cirq.Circuit:
+        """Concatenation of noisy operations of all blocks, the idx-th block choosing the config[idx]-th Pauli string"""
+        return cirq.Circuit(chain.from_iterable(self.noisy_operation(idx, alpha).all_operations()
+                                                for idx, alpha in enumerate(config)))
+
+    def to_mitiq(self, level_idx: int = 0) -> list:
+        """Convert representations at the level_idx-th noise level to mitiq OperationRepresentation instances"""
+        from mitiq.pec import OperationRepresentation, NoisyOperation
+
+        reps = []
+        for idx, blk in enumerate(self.blocks):
+            coeffs = self.block_coeffs(idx)[level_idx]
+            noisy_ops = [NoisyOperation(self.noisy_operation(idx, alpha)) for alpha in range(len(coeffs))]
+            reps.append(OperationRepresentation(blk, noisy_ops, coeffs.tolist()))
+        return reps
+
+
+def represent_blocks_with_global_depolarizing_noise(blocks: Sequence[cirq.Circuit],
+                                                    noise_levels: Sequence[float]) -> BlockRepresentations:
+    """Quasi-probability representations of all blocks for all noise levels at once (see BlockRepresentations)"""
+    return BlockRepresentations(blocks, noise_levels)
+
+
+class PECSamples:
+    """
+    Deduplicated Monte-Carlo samples of block-wise PEC.
+    ---
+    Each sample configuration picks one noisy operation (Pauli string index) per block; identical configurations are
+    merged, so that only distinct circuits need to be materialized and executed.
+
+    Attributes:
+        configs: Distinct configurations of shape (U, B), in lexicographic order
+        counts: Number of occurrences of each distinct configuration, of shape (U,)
+        signs: Sign (+1/-1) of the quasi-probability product of each distinct configuration, of shape (U,)
+        gamma: One-norm of the representation of the whole circuit
+        num_samples: Total number of samples (i.e., counts.sum())
+    """
+
+    def __init__(self, reps: BlockRepresentations, configs: np.ndarray, counts: np.ndarray, signs: np.ndarray,
+                 gamma: float):
+        self.reps = reps
+        self.configs = configs
+        self.counts = counts
+        self.signs = signs
+        self.gamma = gamma
+        self.num_samples = int(counts.sum())
+
+    def __len__(self) -> int:
+        return len(self.configs)
+
+    def circuits(self) -> Iterator[cirq.Circuit]:
+        """Materialize distinct sampled circuits lazily, in the order of configs"""
+        for config in self.configs:
+            yield self.reps.sampled_circuit(config)
+
+    def estimate(self, values: Sequence[float]) -> float:
+        """Unbiased PEC estimate from expectation values of distinct sampled circuits (in the order of configs)"""
+        return self.gamma * np.dot(self.counts * self.signs, values) / self.num_samples
+
+
+def sample_blocks(reps: BlockRepresentations, num_samples: int, level_idx: int = 0,
+                  random_state: np.random.Generator = None) -> PECSamples:
+    """
+    Draw num_samples configurations of noisy operations of all blocks at once.
+    ---
+    Blocks of the same number of qubits share the same sampling distribution (|coeffs| / gamma), so that choices of
+    all of them are drawn by a single vectorized call; then identical configurations are merged by np.unique.
+
+    Args:
+        reps: Representations of blocks
+        num_samples: Number of samples (shots of sampled circuits)
+        level_idx: Index of the noise level in reps.noise_levels
+        random_state: NumPy random generator (or seed)
+
+    Returns:
+        Deduplicated samples
+    """
+    rng = np.random.default_rng(random_state)
+    dtype = np.uint8 if 4 ** max(reps.num_qubits, default=0) <= 256 else np.uint16
+    configs = np.zeros((num_samples, len(reps)), dtype=dtype)
+    num_negatives = np.zeros(num_samples, dtype=int)
+    for k, coeffs in reps.coeffs.items():
+        coeffs = coeffs[level_idx]
+        cols = np.flatnonzero(reps.num_qubits == k)
+        choices = rng.choice(len(coeffs), size=(num_samples, len(cols)), p=np.abs(coeffs) / np.abs(coeffs).sum())
+        configs[:, cols] = choices
+        num_negatives += (coeffs[choices] < 0).sum(axis=1)
+    signs = 1 - 2 * (num_negatives % 2)
+    configs, inverse, counts = np.unique(configs, axis=0, return_inverse=True, return_counts=True)
+    unique_signs = np.empty(len(configs), dtype=int)
+    unique_signs[inverse.ravel()] = signs
+    return PECSamples(reps, configs, counts, unique_signs, float(reps.total_gammas[level_idx]))
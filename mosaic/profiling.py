@@ -0,0 +1,140 @@
+"""
+Opt-in instrumentation of hot paths, i.e., per-phase timers and counters
+"""
+import json
+import time
+import cProfile
+from functools import wraps
+from contextlib import contextmanager, nullcontext
+from collections import Counter, defaultdict
+
+_profiler = None  # the active Profiler, if any
+_null_phase = nullcontext()
+
+
+class Profiler:
+    """
+    Collector of per-phase timers and counters of instrumented code (partition, passes, circuits and graphs).
+    ---
+    Use it as a context manager, e.g.,
+
+        with mosaic.profiling.Profiler() as prof:
+            blocks = mosaic.partition.seq_partition(circ, 3)
+        prof.print_report()
+        prof.to_chrome_trace('trace.json')  # open in chrome://tracing or Perfetto
+
+    When no profiler is active, instrumentation points (phase, count and timed below) cost one global lookup.
+    If cprofile is True, cProfile also runs within the context and its statistics can be dumped by dump_stats.
+    """
+
+    def __init__(self, cprofile: bool = False, max_events: int = 10 ** 6):
+        self.timers = defaultdict(float)  # phase -> total time in seconds
+        self.calls = Counter()  # phase -> number of entries
+        self.counters = Counter()
+        self.events = []  # (phase, start, duration), relative to the entry of the context
+        self.max_events = max_events
+        self._cprofile = cProfile.Profile() if cprofile else None
+        self._origin = None
+        self._previous = None
+
+    def __enter__(self) -> 'Profiler':
+        global _profiler
+        self._previous, _profiler = _profiler, self
+        self._origin = time.perf_counter()
+        if self._cprofile is not None:
+            self._cprofile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        global _profiler
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        _profiler = self._previous
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.timers[name] += duration
+            self.calls[name] += 1
+            if len(self.events) < self.max_events:
+                self.events.append((name, start - self._origin, duration))
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] += n
+
+    def report(self) -> str:
+        """Plain-text report of timers (sorted by total time) and counters"""
+        lines = ['{:<36}{:>10}{:>14}'.format('phase', 'calls', 'time (s)')]
+        for name, t in sorted(self.timers.items(), key=lambda item: -item[1]):
+            lines.append('{:<36}{:>10}{:>14.6f}'.format(name, self.calls[name], t))
+        lines.append('')
+        lines.append('{:<36}{:>24}'.format('counter', 'value'))
+        for name, value in sorted(self.counters.items()):
+            lines.append('{:<36}{:>24}'.format(name, value))
+        return '\n'.join(lines)
+
+    def print_report(self):
+        from rich.console import Console  # imported on demand, such that importing mosaic does not load rich
+        from rich.table import Table
+
+        console = Console()
+        table = Table(title='Timers')
+        for col in ['phase', 'calls', 'time (s)']:
+            table.add_column(col)
+        for name, t in sorted(self.timers.items(), key=lambda item: -item[1]):
+            table.add_row(name, str(self.calls[name]), '{:.6f}'.format(t))
+        console.print(table)
+        table = Table(title='Counters')
+        for col in ['counter', 'value']:
+            table.add_column(col)
+        for name, value in sorted(self.counters.items()):
+            table.add_row(name, str(value))
+        console.print(table)
+
+    def to_chrome_trace(self, fname: str):
+        """Export phases as complete events and counters as counter events of the Chrome trace format"""
+        events = [{'name': name, 'ph': 'X', 'ts': start * 1e6, 'dur': duration * 1e6, 'pid': 0, 'tid': 0}
+                  for name, start, duration in self.events]
+        end = max([start + duration for _, start, duration in self.events], default=0)
+        events.extend({'name': name, 'ph': 'C', 'ts': end * 1e6, 'pid': 0, 'args': {'value': value}}
+                      for name, value in self.counters.items())
+        with open(fname, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+    def dump_stats(self, fname: str):
+        """Dump cProfile statistics (readable by pstats, snakeviz, etc.)"""
+        if self._cprofile is None:
+            raise ValueError('cProfile is not enabled (set cprofile=True).')
+        self._cprofile.dump_stats(fname)
+
+
+def phase(name: str):
+    """Time a phase in the active profiler, if any, e.g., `with profiling.phase('partition.grow'): ...`"""
+    if _profiler is None:
+        return _null_phase
+    return _profiler.phase(name)
+
+
+def count(name: str, n: int = 1):
+    """Increase a counter of the active profiler, if any"""
+    if _profiler is not None:
+        _profiler.counters[name] += n
+
+
+def timed(name: str):
+    """Decorator timing each call of the function as a phase in the active profiler, if any"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return func(*args, **kwargs)
+            with _profiler.phase(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
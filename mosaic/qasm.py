@@ -0,0 +1,274 @@
+"""
+Streaming OpenQASM 2.0 reader emitting the compact gate stream
+"""
+import re
+import mmap
+import cirq
+import numpy as np
+from typing import Dict, Iterator, List, Tuple, Union
+
+from .compact import CompactCircuit
+
+_statement_pattern = re.compile(r'([A-Za-z_]\w*)\s*(?:\((.*)\))?\s*(.*)', re.S)
+_arg_pattern = re.compile(r'([A-Za-z_]\w*)\s*(?:\[\s*(\d+)\s*\])?')
+_register_pattern = re.compile(r'([A-Za-z_]\w*)\s*\[\s*(\d+)\s*\]')
+_expr_pattern = re.compile(r'[\s\d.eE+\-*/^()a-z,]*')
+_expr_namespace = {'__builtins__': {}, 'pi': np.pi, 'sin': np.sin, 'cos': np.cos, 'tan': np.tan, 'exp': np.exp,
+                   'ln': np.log, 'sqrt': np.sqrt, 'acos': np.arccos, 'atan': np.arctan, 'asin': np.arcsin}
+_ignored_statements = {'OPENQASM', 'include', 'barrier'}
+
+
+class UnsupportedQasm(Exception):
+    """Raised on QASM constructs beyond gate applications and trailing measurements (e.g., gate definitions, if)"""
+
+
+def iter_qasm(fname: str, use_mmap: bool = False, registers: Dict[str, Tuple[int, int]] = None,
+              measurements: List[Tuple[int, str, int]] = None
+              ) -> Iterator[Tuple[str, Tuple[float, ...], Tuple[int, ...]]]:
+    """
+    Tokenize an OpenQASM 2.0 file in one pass, yielding (gate name, params, qubit indices) of each gate application.
+    ---
+    Qubit indices are global, i.e., registers are laid out in the order of their declarations. Applications on
+    whole registers are broadcast as in OpenQASM. The file is read line by line, either through a buffered file
+    object or a memory map (use_mmap=True, which avoids copying large files into the Python heap).
+    If registers (a dict) is given, declared quantum registers are recorded into it as name -> (offset, size).
+    Measurements are not yielded but accepted as long as no gate is applied on measured qubits afterwards (e.g.,
+    trailing measurements); if measurements (a list) is given, they are recorded into it as (qubit index,
+    classical register, bit index).
+    Raises UnsupportedQasm on gate definitions, resets, classically controlled operations and gates following
+    measurements on their qubits, as well as on malformed statements (e.g., undeclared registers, indices out of
+    range, unevaluable parameters).
+    """
+    if registers is None:
+        registers = {}
+    cregs = {}
+    measured = set()
+    for statement in _iter_statements(fname, use_mmap):
+        match = _statement_pattern.fullmatch(statement)
+        if match is None:
+            raise UnsupportedQasm('cannot parse statement "{}"'.format(statement))
+        name, params, args = match.groups()
+        if name in _ignored_statements:
+            continue
+        if name in ('qreg', 'creg'):
+            match = _register_pattern.fullmatch(args.strip())
+            if match is None:
+                raise UnsupportedQasm('cannot parse statement "{}"'.format(statement))
+            reg, size = match.groups()
+            declared = registers if name == 'qreg' else cregs
+            declared[reg] = (sum(size for _, size in declared.values()), int(size))
+            continue
+        if name in ('gate', 'opaque', 'reset', 'if'):
+            raise UnsupportedQasm('"{}" statements are not supported'.format(name))
+        if name == 'measure':
+            if params is not None or args.count('->') != 1:
+                raise UnsupportedQasm('cannot parse statement "{}"'.format(statement))
+            qarg, carg = args.split('->')
+            qubits, bits = _arg_indices(qarg, registers, statement), _arg_indices(carg, cregs, statement)
+            if len(qubits) != len(bits):
+                raise UnsupportedQasm('registers of different sizes in statement "{}"'.format(statement))
+            creg = carg.split('[')[0].strip()
+            for q, bit in zip(qubits, bits):
+                measured.add(q)
+                if measurements is not None:
+                    measurements.append((q, creg, bit - cregs[creg][0]))
+            continue
+        params = tuple(_eval_param(p, statement) for p in params.split(',')) if params else ()
+        for application in zip(*_broadcast([_arg_indices(arg, registers, statement) for arg in args.split(',')],
+                                           statement)):
+            if len(set(application)) < len(application):
+                raise UnsupportedQasm('repeated qubits in statement "{}"'.format(statement))
+            if measured and not measured.isdisjoint(application):
+                raise UnsupportedQasm('gate on measured qubits in statement "{}"'.format(statement))
+            yield name, params, application
+
+
+def iter_qasm_ops(fname: str, use_mmap: bool = False) -> Iterator[cirq.Operation]:
+    """
+    Stream cirq operations (e.g., into stream_partition), qubits being named as cirq.contrib.qasm_import does.
+    Measurements are skipped (see iter_qasm).
+    ---
+    The file is tokenized twice: the first pass checks the whole file and creates the cirq gates, such that files
+    with unsupported constructs fall back to cirq's QASM importer before any operation is yielded, and the second
+    pass yields operations. Memory stays bounded by the number of distinct gates.
+    """
+    registers = {}
+    gates = {}
+    try:
+        for name, params, qubits in iter_qasm(fname, use_mmap, registers):
+            key = (name, params, tuple(map(type, params)), len(qubits))  # 3 and 3.0 are distinct params of cirq gates
+            if key not in gates:
+                gates[key] = _cirq_gate(name, params, len(qubits))
+    except UnsupportedQasm:
+        yield from read_qasm(fname, as_circuit=True).all_operations()
+        return
+
+    qubit_names = _qubit_names(registers)
+    for name, params, qubits in iter_qasm(fname, use_mmap):
+        yield gates[name, params, tuple(map(type, params)), len(qubits)].on(*[qubit_names[q] for q in qubits])
+
+
+def read_qasm(fname: str, use_mmap: bool = False, as_circuit: bool = False) -> Union[CompactCircuit, cirq.Circuit]:
+    """
+    Read an OpenQASM 2.0 file into a CompactCircuit (e.g., for seq_partition), without building cirq operations.
+    ---
+    Gates are ordered as in the circuit built by cirq (moments of the EARLIEST insertion strategy), and qubits are
+    cirq.NamedQubit instances sorted as cirq does, so the result is equivalent to
+    CompactCircuit.from_circuit(circuit_from_qasm(...)) up to measurements, which are skipped (see iter_qasm).
+    Only one cirq gate per distinct (name, params) is created.
+    Files with unsupported constructs (see iter_qasm) fall back to cirq's QASM importer.
+
+    Args:
+        fname: Path of the QASM file
+        use_mmap: Whether to read the file through a memory map
+        as_circuit: If True, convert the result to a cirq.Circuit
+
+    Returns:
+        The compact circuit (or the cirq circuit)
+    """
+    try:
+        registers = {}
+        gate_index = {}
+        rows, opcodes = [], []
+        for name, params, qubits in iter_qasm(fname, use_mmap, registers):
+            key = (name, params, tuple(map(type, params)), len(qubits))
+            opcodes.append(gate_index.setdefault(key, len(gate_index)))
+            rows.append(qubits)
+        gate_table = [_cirq_gate(name, params, num_args) for name, params, _, num_args in gate_index]
+    except UnsupportedQasm:
+        from cirq.contrib.qasm_import import circuit_from_qasm
+
+        with open(fname, 'r') as f:
+            circ = circuit_from_qasm(f.read())
+        return circ if as_circuit else CompactCircuit.from_circuit(circ)
+
+    qubit_names = _qubit_names(registers)
+    used = sorted({q for row in rows for q in row}, key=qubit_names.__getitem__)
+    relabel = {q: i for i, q in enumerate(used)}
+
+    # stable sort by layers, i.e., the order of circ.all_operations() of the circuit built by cirq
+    layers = []
+    last_layers = {}  # qubit -> the last layer acting on it
+    for row in rows:
+        layer = max([last_layers.get(q, -1) for q in row], default=-1) + 1
+        for q in row:
+            last_layers[q] = layer
+        layers.append(layer)
+    order = np.argsort(layers, kind='stable').tolist()
+
+    width = max(map(len, rows), default=1)
+    qubits = np.full((len(rows), width), -1, dtype=np.int32)
+    for i, idx in enumerate(order):
+        qubits[i, :len(rows[idx])] = [relabel[q] for q in rows[idx]]
+    weights = np.array([len(rows[idx]) for idx in order], dtype=np.int8)
+    opcodes = np.array(opcodes, dtype=np.int32)[order] if rows else np.zeros(0, dtype=np.int32)
+    cc = CompactCircuit(qubits, weights, opcodes, gate_table, [qubit_names[q] for q in used])
+    return cc.to_circuit() if as_circuit else cc
+
+
+def _iter_statements(fname: str, use_mmap: bool) -> Iterator[str]:
+    with open(fname, 'rb') as f:
+        if use_mmap:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield from _split_statements(iter(mm.readline, b''))
+        else:
+            yield from _split_statements(f)
+
+
+def _split_statements(lines) -> Iterator[str]:
+    buffer = ''
+    for line in lines:
+        line = line.decode()
+        if '//' in line:
+            line = line[:line.index('//')]
+        buffer += line
+        if ';' in buffer:
+            *statements, buffer = buffer.split(';')
+            for statement in statements:
+                if statement := statement.strip():
+                    yield statement
+    if buffer.strip():
+        raise UnsupportedQasm('unterminated statement "{}"'.format(buffer.strip()))
+
+
+def _qubit_names(registers: Dict[str, Tuple[int, int]]) -> List[cirq.NamedQubit]:
+    """Qubits by global index, named as cirq.contrib.qasm_import does (e.g., q_0)"""
+    return [cirq.NamedQubit('{}_{}'.format(reg, i)) for reg, (_, size) in registers.items() for i in range(size)]
+
+
+def _arg_indices(arg: str, registers: Dict[str, Tuple[int, int]], statement: str) -> List[int]:
+    """Global indices of a register argument (e.g., q[1] or q for the whole register) of a statement"""
+    match = _arg_pattern.fullmatch(arg.strip())
+    if match is None:
+        raise UnsupportedQasm('cannot parse argument "{}" of statement "{}"'.format(arg.strip(), statement))
+    reg, idx = match.groups()
+    if reg not in registers:
+        raise UnsupportedQasm('undeclared register "{}" in statement "{}"'.format(reg, statement))
+    offset, size = registers[reg]
+    if idx is None:
+        return list(range(offset, offset + size))
+    if int(idx) >= size:
+        raise UnsupportedQasm('index out of range in statement "{}"'.format(statement))
+    return [offset + int(idx)]
+
+
+def _broadcast(indices: List[List[int]], statement: str) -> List[List[int]]:
+    """Broadcast indices of arguments over whole registers as in OpenQASM, i.e., single indices are repeated"""
+    width = max(map(len, indices))
+    if any(len(idx) not in (1, width) for idx in indices):
+        raise UnsupportedQasm('registers of different sizes in statement "{}"'.format(statement))
+    return [idx * width if len(idx) == 1 else idx for idx in indices]
+
+
+def _eval_param(expr: str, statement: str) -> Union[int, float]:
+    if not _expr_pattern.fullmatch(expr):
+        raise UnsupportedQasm('cannot evaluate parameter "{}" of statement "{}"'.format(expr.strip(), statement))
+    try:
+        value = eval(expr.replace('^', '**'), _expr_namespace)
+        return value if isinstance(value, int) else float(value)  # integers are kept as cirq does
+    except (NameError, SyntaxError, TypeError, ArithmeticError, ValueError, AttributeError):
+        raise UnsupportedQasm('cannot evaluate parameter "{}" of statement "{}"'.format(expr.strip(), statement))
+
+
+_gate_statements = None
+
+
+def _cirq_gate(name: str, params: Tuple[float, ...], num_args: int) -> cirq.Gate:
+    """
+    The cirq gate of a QASM gate application (on num_args qubits), as created by cirq.contrib.qasm_import.
+    Gates are looked up from the gate tables of cirq's (private) QASM parser, or created by importing the single
+    application if those are unavailable (e.g., moved in another version of cirq).
+    """
+    global _gate_statements
+    if _gate_statements is None:
+        try:
+            from cirq.contrib.qasm_import._parser import QasmParser
+
+            _gate_statements = {**QasmParser.basic_gates, **QasmParser.qelib_gates}
+        except (ImportError, AttributeError):
+            _gate_statements = {}
+    if not _gate_statements:
+        return _import_gate(name, params, num_args)
+    if name not in _gate_statements:
+        raise UnsupportedQasm('unknown gate "{}"'.format(name))
+    statement = _gate_statements[name]
+    if (statement.num_params, statement.num_args) != (len(params), num_args):
+        raise UnsupportedQasm('gate "{}" applied with {} parameters on {} qubits'.format(name, len(params), num_args))
+    gate = statement.cirq_gate
+    return gate if isinstance(gate, cirq.Gate) else gate(list(params))
+
+
+def _import_gate(name: str, params: Tuple[float, ...], num_args: int) -> cirq.Gate:
+    """The cirq gate of a QASM gate application, by importing a program of that application alone"""
+    from cirq.contrib.qasm_import import QasmException, circuit_from_qasm
+
+    application = '{}({})'.format(name, ','.join(map(repr, params))) if params else name
+    program = 'OPENQASM 2.0;\ninclude "qelib1.inc";\nqreg q[{}];\n{} {};\n'.format(
+        num_args, application, ','.join('q[{}]'.format(i) for i in range(num_args)))
+    try:
+        ops = list(circuit_from_qasm(program).all_operations())
+    except QasmException as err:
+        raise UnsupportedQasm('cannot import gate "{}": {}'.format(application, err))
+    if len(ops) != 1:
+        raise UnsupportedQasm('gate "{}" is not imported as a single operation'.format(application))
+    return ops[0].gate
@@ -0,0 +1,76 @@
+"""
+Vectorized generation of large random circuits (e.g., for scaling benchmarks of partitioning)
+"""
+import cirq
+import numpy as np
+from typing import Sequence, Union
+
+from .compact import CompactCircuit
+
+ONE_Q_GATES = (cirq.X, cirq.H, cirq.S, cirq.S ** -1, cirq.T, cirq.T ** -1)
+TWO_Q_GATES = (cirq.CNOT,)
+
+_chunk_size = 2 ** 22  # maximum number of slots (layers x qubits) drawn at once, bounding memory
+
+
+def random_circuit(num_qubits: int, depth: int, seed: int = None, one_q_gates: Sequence[cirq.Gate] = ONE_Q_GATES,
+                   two_q_gates: Sequence[cirq.Gate] = TWO_Q_GATES,
+                   as_circuit: bool = False) -> Union[CompactCircuit, cirq.Circuit]:
+    """
+    Generate a random circuit of the given number of qubits and depth, in the way of gene_random_circuit in
+    benchmarks/gene_rand_circ.py, without building gates one by one.
+    ---
+    In each layer, qubits are randomly permuted and split into operands of 1Q or 2Q gates (each with probability
+    1/2), and gates are chosen uniformly from one_q_gates and two_q_gates respectively. Permutations, operand
+    splits and gate choices of many layers are drawn in bulk by NumPy, seeded reproducibly by seed.
+    Every layer covers all qubits, thus gates are in the order of moments, and the CompactCircuit (the default
+    result) can be passed to seq_partition as is; qubits are cirq.LineQubit.range(num_qubits).
+    Complexity: O(depth * num_qubits), vectorized except for the bitmasks of CompactCircuit
+
+    Args:
+        num_qubits: Number of qubits
+        depth: Number of layers
+        seed: Seed of the random generator (random if not given)
+        one_q_gates: Candidate 1Q gates
+        two_q_gates: Candidate 2Q gates
+        as_circuit: If True, convert the result to a cirq.Circuit (of one moment per layer)
+
+    Returns:
+        The compact circuit (or the cirq circuit)
+    """
+    if num_qubits < 1 or depth < 0:
+        raise ValueError('num_qubits must be positive and depth must be non-negative.')
+    rng = np.random.default_rng(seed)
+    dtype = np.int32
+    rows, weights, opcodes, layer_sizes = [], [], [], []
+    layers_per_chunk = max(1, _chunk_size // num_qubits)
+    for start in range(0, depth, layers_per_chunk):
+        num_layers = min(layers_per_chunk, depth - start)
+        perms = rng.permuted(np.broadcast_to(np.arange(num_qubits, dtype=dtype), (num_layers, num_qubits)), axis=1)
+        sizes = rng.integers(1, 3, size=(num_layers, num_qubits), dtype=np.int8)
+        offsets = np.cumsum(sizes, axis=1, dtype=dtype) - sizes  # first operand of each gate within the layer
+        valid = offsets < num_qubits
+        sizes[offsets == num_qubits - 1] = 1  # a single qubit left in a layer can only be the operand of a 1Q gate
+        layer_idx, _ = np.nonzero(valid)
+        offsets = offsets[valid]
+        sizes = sizes[valid]
+        is_2q = sizes == 2
+        gate_rows = np.full((len(sizes), 2), -1, dtype=dtype)
+        gate_rows[:, 0] = perms[layer_idx, offsets]
+        gate_rows[is_2q, 1] = perms[layer_idx[is_2q], offsets[is_2q] + 1]
+        codes = np.where(is_2q, len(one_q_gates) + rng.integers(len(two_q_gates), size=len(sizes), dtype=dtype),
+                         rng.integers(len(one_q_gates), size=len(sizes), dtype=dtype))
+        rows.append(gate_rows)
+        weights.append(sizes)
+        opcodes.append(codes.astype(dtype))
+        layer_sizes.append(np.bincount(layer_idx, minlength=num_layers))
+
+    cc = CompactCircuit(np.concatenate(rows) if rows else np.zeros((0, 2), dtype=dtype),
+                        np.concatenate(weights) if weights else np.zeros(0, dtype=np.int8),
+                        np.concatenate(opcodes) if opcodes else np.zeros(0, dtype=dtype),
+                        list(one_q_gates) + list(two_q_gates), cirq.LineQubit.range(num_qubits))
+    if not as_circuit:
+        return cc
+    bounds = np.cumsum(np.concatenate([[0]] + layer_sizes)).tolist()
+    return cirq.Circuit.from_moments(*[cirq.Moment(cc.op(idx) for idx in range(begin, end))
+                                       for begin, end in zip(bounds[:-1], bounds[1:])])
@@ -0,0 +1,160 @@
+"""
+Block-by-block noisy simulation of PEC samples with reuse of shared prefixes
+"""
+import cirq
+import numpy as np
+from functools import reduce
+from collections import OrderedDict
+from typing import Callable, Dict, Sequence, Union
+
+from .pec import BlockRepresentations, PECSamples, pauli_basis
+from .unitaries import block_unitaries
+
+
+class _TrieNode:
+    __slots__ = ('parent', 'choice', 'children', 'state')
+
+    def __init__(self, parent: '_TrieNode' = None, choice: int = None, state: np.ndarray = None):
+        self.parent = parent
+        self.choice = choice
+        self.children = {}
+        self.state = state
+
+
+class PrefixCachedExecutor:
+    """
+    Noisy density-matrix executor of sampled circuits of block-wise PEC.
+    ---
+    The noisy operation (idx-th block, alpha-th Pauli string) is the superoperator D o P_alpha o U_idx, where D is the
+    global depolarizing channel of the block at the representation's noise level. Superoperators are precomputed per
+    structural class of blocks and Pauli string, and applied block by block to the density matrix.
+    Intermediate states are kept in a trie keyed by the prefix of choices, so that samples sharing prefixes (which is
+    common since the identity is the most likely choice) only simulate their distinct suffixes. Cached states are
+    evicted in LRU order once they exceed max_cache_bytes.
+
+    Args:
+        reps: Representations of blocks
+        observable: Operator (2^n x 2^n matrix) whose expectation value is computed, or a function of the final
+            density matrix returning a value
+        level_idx: Index of the noise level in reps.noise_levels
+        qubits: Qubit order of the density matrix; sorted qubits of blocks if not given
+        max_cache_bytes: Memory bound of cached intermediate states
+    """
+
+    def __init__(self, reps: BlockRepresentations, observable: Union[np.ndarray, Callable[[np.ndarray], float]],
+                 level_idx: int = 0, qubits: Sequence[cirq.Qid] = None, max_cache_bytes: int = 2 ** 28):
+        if qubits is None:
+            qubits = sorted(set().union(*[blk.all_qubits() for blk in reps.blocks]))
+        self.reps = reps
+        self.observable = observable
+        self.noise_level = float(reps.noise_levels[level_idx])
+        self.qubits = list(qubits)
+        self.max_cache_bytes = max_cache_bytes
+        qubit_index = {q: i for i, q in enumerate(self.qubits)}
+        self._positions = [[qubit_index[q] for q in sorted(blk.all_qubits())] for blk in reps.blocks]
+        self._unitaries = block_unitaries(reps.blocks)
+        self._superops = {}  # (class, alpha) -> superoperator tensor
+        self._depolarizing = {}  # number of qubits -> superoperator matrix
+        self._lru = OrderedDict()  # trie nodes with cached states, in LRU order
+        self.cache_bytes = 0
+        self.blocks_simulated = 0
+        self.blocks_reused = 0
+        n = len(self.qubits)
+        rho = np.zeros((2 ** n, 2 ** n), dtype=np.complex128)
+        rho[0, 0] = 1
+        self._root = _TrieNode(state=rho.reshape([2] * 2 * n))
+
+    def __call__(self, config: Sequence[int]) -> float:
+        """Expectation value of the sampled circuit of the given configuration"""
+        return self._measure(self._final_state(config))
+
+    def run(self, configs: np.ndarray) -> np.ndarray:
+        """Expectation values of many configurations, evaluated in lexicographic order to maximize prefix reuse"""
+        configs = np.asarray(configs)
+        values = np.empty(len(configs))
+        for i in np.lexsort(configs.T[::-1]) if configs.size else range(len(configs)):
+            values[i] = self(configs[i].tolist())
+        return values
+
+    def estimate(self, samples: PECSamples) -> float:
+        """PEC estimate of the observable from samples"""
+        return samples.estimate(self.run(samples.configs))
+
+    def clear(self):
+        """Drop cached intermediate states"""
+        self._root.children.clear()
+        self._lru.clear()
+        self.cache_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {'blocks_simulated': self.blocks_simulated, 'blocks_reused': self.blocks_reused,
+                'cached_states': len(self._lru), 'cached_bytes': self.cache_bytes}
+
+    def _final_state(self, config: Sequence[int]) -> np.ndarray:
+        node, best, depth, best_depth = self._root, self._root, 0, 0
+        for alpha in config:
+            node = node.children.get(alpha)
+            if node is None:
+                break
+            depth += 1
+            if node.state is not None:
+                best, best_depth = node, depth
+        if best is not self._root:
+            self._lru.move_to_end(best)
+        self.blocks_reused += best_depth
+        node, state = best, best.state
+        for idx in range(best_depth, len(config)):
+            state = self._apply(state, idx, config[idx])
+            self.blocks_simulated += 1
+            if idx + 1 < len(config) and state.nbytes <= self.max_cache_bytes:
+                node = self._store(node, config[idx], state)
+        return state
+
+    def _store(self, parent: _TrieNode, choice: int, state: np.ndarray) -> _TrieNode:
+        node = parent.children.get(choice)
+        if node is None:
+            node = parent.children[choice] = _TrieNode(parent, choice)
+        if node.state is None:
+            node.state = state
+            self.cache_bytes += state.nbytes
+        self._lru[node] = None
+        self._lru.move_to_end(node)
+        while self.cache_bytes > self.max_cache_bytes:
+            self._evict(self._lru.popitem(last=False)[0])
+        return node
+
+    def _evict(self, node: _TrieNode):
+        self.cache_bytes -= node.state.nbytes
+        node.state = None
+        while node is not self._root and node.state is None and not node.children:
+            del node.parent.children[node.choice]
+            node = node.parent
+
+    def _apply(self, state: np.ndarray, idx: int, alpha: int) -> np.ndarray:
+        n = len(self.qubits)
+        pos = self._positions[idx]
+        k = len(pos)
+        axes = pos + [n + p for p in pos]
+        state = np.tensordot(self._superop(idx, alpha), state, axes=(list(range(2 * k, 4 * k)), axes))
+        return np.moveaxis(state, list(range(2 * k)), axes)
+
+    def _superop(self, idx: int, alpha: int) -> np.ndarray:
+        key = (self.reps.classes[idx], alpha)
+        if key not in self._superops:
+            k = len(self._positions[idx])
+            pauli = reduce(np.kron, [cirq.unitary(p) for p in pauli_basis(k)[alpha]], np.identity(1))
+            u = pauli @ self._unitaries[idx]
+            superop = self._depolarizing_superop(k) @ np.kron(u, u.conj())  # row-major vectorization
+            self._superops[key] = superop.reshape([2] * 4 * k)
+        return self._superops[key]
+
+    def _depolarizing_superop(self, k: int) -> np.ndarray:
+        if k not in self._depolarizing:
+            self._depolarizing[k] = cirq.kraus_to_superoperator(cirq.kraus(cirq.depolarize(self.noise_level, k)))
+        return self._depolarizing[k]
+
+    def _measure(self, state: np.ndarray) -> float:
+        rho = state.reshape(2 ** len(self.qubits), -1)
+        if callable(self.observable):
+            return self.observable(rho)
+        return np.sum(self.observable.T * rho).real
@@ -0,0 +1,158 @@
+"""
+Parallel sweeps of block-wise PEC over noise levels and sample batches
+"""
+import os
+import time
+import cirq
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Iterator, List, Sequence, Union
+
+from .partition import seq_partition
+from .pec import BlockRepresentations, sample_blocks
+from .simulation import PrefixCachedExecutor
+
+
+class SweepResult:
+    """
+    Aggregated results of a sweep.
+
+    Attributes:
+        noise_levels: Noise levels of shape (R,)
+        estimates: PEC estimates of the observable at each noise level, of shape (R,)
+        noisy: Unmitigated (noisy) values of the observable at each noise level, of shape (R,)
+        gammas: One-norms of the representation of the whole circuit at each noise level, of shape (R,)
+        num_blocks: Number of blocks of the partitioned circuit
+        timings: Wall time (in seconds) of each stage; times of per-shard stages are summed over shards
+    """
+
+    def __init__(self, noise_levels: np.ndarray, estimates: np.ndarray, noisy: np.ndarray, gammas: np.ndarray,
+                 num_blocks: int, timings: Dict[str, float]):
+        self.noise_levels = noise_levels
+        self.estimates = estimates
+        self.noisy = noisy
+        self.gammas = gammas
+        self.num_blocks = num_blocks
+        self.timings = timings
+
+    def __repr__(self) -> str:
+        return 'SweepResult(noise_levels={}, estimates={}, noisy={})'.format(
+            self.noise_levels.tolist(), self.estimates.tolist(), self.noisy.tolist())
+
+
+def iter_sweep(circ: cirq.Circuit, grain: int, noise_levels: Sequence[float], num_samples: int,
+               observable: Union[np.ndarray, Callable[[np.ndarray], float]], batch_size: int = 1000,
+               workers: int = None, seed: int = None, timings: Dict[str, float] = None) -> Iterator[dict]:
+    """
+    Run a sweep and stream results of shards as they complete (see sweep).
+
+    Returns:
+        Iterator of shard results, i.e., dicts with keys 'level_idx', 'batch_idx', 'num_samples', 'weighted_sum'
+        (sum of counts * signs * values), 'noisy' (unmitigated value, for the first batch only), 'gamma',
+        'num_blocks' and 'timings'
+    """
+    if timings is None:
+        timings = {}
+    start = time.perf_counter()
+    blocks = seq_partition(circ, grain)
+    timings['partition'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reps = BlockRepresentations(blocks, noise_levels)
+    timings['representation'] = time.perf_counter() - start
+
+    # shards are (noise level, sample batch), each with its own child seed, independent of the number of workers
+    shards = [(level_idx, batch_idx, min(batch_size, num_samples - offset))
+              for level_idx in range(len(reps.noise_levels))
+              for batch_idx, offset in enumerate(range(0, num_samples, batch_size))]
+    seeds = np.random.SeedSequence(seed).spawn(len(shards))
+    qubits = sorted(circ.all_qubits())
+    if workers is None:
+        workers = os.cpu_count()
+    if workers <= 1:
+        _init_worker(reps, observable, qubits)
+        for shard, seed_seq in zip(shards, seeds):
+            yield _run_shard(*shard, seed_seq)
+        return
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(reps, observable, qubits)) as executor:
+        futures = [executor.submit(_run_shard, *shard, seed_seq) for shard, seed_seq in zip(shards, seeds)]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def sweep(circ: cirq.Circuit, grain: int, noise_levels: Sequence[float], num_samples: int,
+          observable: Union[np.ndarray, Callable[[np.ndarray], float]], batch_size: int = 1000,
+          workers: int = None, seed: int = None, callback: Callable[[dict], None] = None) -> SweepResult:
+    """
+    Block-wise PEC of a circuit over a sweep of noise levels, sharded across a process pool.
+    ---
+    The circuit is partitioned once (seq_partition) and representations of all noise levels are computed at once
+    (BlockRepresentations); then each shard, i.e., a batch of samples at one noise level, is sampled (sample_blocks)
+    and executed (PrefixCachedExecutor) in a worker process. Each shard has its own seed spawned from seed, and
+    shards are aggregated in a fixed order, so results are reproducible regardless of the number of workers.
+
+    Args:
+        circ: Circuit to mitigate
+        grain: Grain of partitioning
+        noise_levels: Noise levels (as cirq.depolarize) of blocks
+        num_samples: Number of samples at each noise level
+        observable: Operator (matrix on sorted qubits of circ) or function of the final density matrix
+        batch_size: Number of samples of each shard
+        workers: Number of worker processes (os.cpu_count() if not given); shards run in-process if workers <= 1
+        seed: Root seed of the sweep
+        callback: Function called with each shard result as it completes (see iter_sweep)
+
+    Returns:
+        Aggregated results
+    """
+    start = time.perf_counter()
+    timings = {}
+    results = []
+    for res in iter_sweep(circ, grain, noise_levels, num_samples, observable, batch_size, workers, seed, timings):
+        results.append(res)
+        if callback is not None:
+            callback(res)
+    results.sort(key=lambda res: (res['level_idx'], res['batch_idx']))
+
+    noise_levels = np.atleast_1d(np.asarray(noise_levels, dtype=float))
+    gammas = np.array([res['gamma'] for res in results if res['batch_idx'] == 0])
+    noisy = np.array([res['noisy'] for res in results if res['batch_idx'] == 0])
+    weighted_sums = np.zeros(len(noise_levels))
+    for res in results:
+        weighted_sums[res['level_idx']] += res['weighted_sum']
+    for stage in ['sampling', 'execution']:
+        timings[stage] = sum(res['timings'][stage] for res in results)
+    timings['total'] = time.perf_counter() - start
+    num_blocks = results[0]['num_blocks'] if results else 0
+    return SweepResult(noise_levels, gammas * weighted_sums / num_samples, noisy, gammas, num_blocks, timings)
+
+
+_worker_state = {}  # state of the sweep worker process, see _init_worker
+
+
+def _init_worker(reps: BlockRepresentations, observable: Union[np.ndarray, Callable[[np.ndarray], float]],
+                 qubits: List[cirq.Qid]):
+    """Receive representations once per worker; the executor (with its cache) is recreated when the noise level changes"""
+    _worker_state.update(reps=reps, observable=observable, qubits=qubits, executor=None)
+
+
+def _run_shard(level_idx: int, batch_idx: int, num_samples: int, seed_seq: np.random.SeedSequence) -> dict:
+    reps = _worker_state['reps']
+    executor = _worker_state['executor']
+    if executor is None or executor.noise_level != reps.noise_levels[level_idx]:
+        executor = _worker_state['executor'] = PrefixCachedExecutor(reps, _worker_state['observable'], level_idx,
+                                                                    _worker_state['qubits'])
+
+    start = time.perf_counter()
+    samples = sample_blocks(reps, num_samples, level_idx, np.random.default_rng(seed_seq))
+    sampling_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    values = executor.run(samples.configs)
+    noisy = executor([0] * len(reps)) if batch_idx == 0 else None
+    execution_time = time.perf_counter() - start
+
+    return {'level_idx': level_idx, 'batch_idx': batch_idx, 'num_samples': num_samples,
+            'weighted_sum': float(np.dot(samples.counts * samples.signs, values)), 'noisy': noisy,
+            'gamma': samples.gamma, 'num_blocks': len(reps),
+            'timings': {'sampling': sampling_time, 'execution': execution_time}}
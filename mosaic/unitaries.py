@@ -0,0 +1,107 @@
+"""
+Vectorized and cached computation of unitaries of (small) blocks
+"""
+import cirq
+import numpy as np
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Sequence, Tuple, Hashable
+
+BLOCK_CACHE_SIZE = 65536
+
+_block_cache = OrderedDict()  # block key -> unitary, in LRU order
+
+
+@lru_cache(maxsize=4096)
+def gate_unitary(gate: cirq.Gate) -> np.ndarray:
+    """Unitary of a gate (read-only), memoized by gate type and parameters (i.e., value equality of cirq gates)"""
+    u = np.array(cirq.unitary(gate))  # copied since cirq might return shared arrays
+    u.flags.writeable = False
+    return u
+
+
+@lru_cache(maxsize=16384)
+def _embedded_unitary(gate: cirq.Gate, positions: Tuple[int, ...], num_qubits: int) -> np.ndarray:
+    """Unitary of gate acting on given positions among num_qubits qubits (big-endian as cirq)"""
+    u = gate_unitary(gate)
+    others = [q for q in range(num_qubits) if q not in positions]
+    u = np.kron(u, np.identity(2 ** len(others))).reshape([2] * 2 * num_qubits)  # axes follow positions + others
+    perm = list(np.argsort(list(positions) + others))
+    u = u.transpose(perm + [num_qubits + p for p in perm]).reshape(2 ** num_qubits, 2 ** num_qubits)
+    u.flags.writeable = False
+    return u
+
+
+def block_key(block: cirq.Circuit) -> Tuple[int, Tuple[Tuple[Hashable, Tuple[int, ...]], ...]]:
+    """
+    Structural key of a block, i.e., its number of qubits and the sequence of gates on local (sorted) positions,
+    such that blocks of the same key have the same unitary
+    """
+    qubit_index = {q: i for i, q in enumerate(sorted(block.all_qubits()))}
+    return len(qubit_index), tuple((op.gate, tuple(qubit_index[q] for q in op.qubits)) for op in block.all_operations())
+
+
+def block_unitary(block: cirq.Circuit) -> np.ndarray:
+    """Unitary of a block (in the qubit order of cirq.unitary, i.e., sorted qubits), cached by block structure"""
+    return block_unitaries([block])[0]
+
+
+def block_unitaries(blocks: Sequence[cirq.Circuit], batch_size: int = 1024) -> List[np.ndarray]:
+    """
+    Unitaries of many small blocks, computed in batch.
+    ---
+    Blocks are grouped by number of qubits k; gates of each block are embedded as 2^k x 2^k matrices (memoized),
+    padded by identities to the same length L and stacked, then multiplied by log(L) rounds of batched matmul.
+    Results are cached by block structure (see block_key), thus structurally identical blocks are computed once.
+
+    Args:
+        blocks: Blocks (subcircuits) whose gates have unitaries
+        batch_size: Maximum number of blocks multiplied at once, limiting the memory of stacked matrices
+
+    Returns:
+        Unitaries of blocks (read-only arrays, shared by structurally identical blocks)
+    """
+    keys = [block_key(blk) for blk in blocks]
+    results = {}
+    missing = {}  # number of qubits -> keys to compute
+    for key in keys:
+        if key in results:
+            continue
+        if key in _block_cache:
+            _block_cache.move_to_end(key)
+            results[key] = _block_cache[key]
+        else:
+            missing.setdefault(key[0], {})[key] = None
+    for num_qubits, group in missing.items():
+        group = list(group)
+        for i in range(0, len(group), batch_size):
+            batch = group[i:i + batch_size]
+            for key, u in zip(batch, _multiply_batch(batch, num_qubits)):
+                u.flags.writeable = False
+                results[key] = _block_cache[key] = u
+    while len(_block_cache) > BLOCK_CACHE_SIZE:
+        _block_cache.popitem(last=False)
+    return [results[key] for key in keys]
+
+
+def clear_cache():
+    """Clear memoized gate and block unitaries"""
+    _block_cache.clear()
+    gate_unitary.cache_clear()
+    _embedded_unitary.cache_clear()
+
+
+def _multiply_batch(keys: List[tuple], num_qubits: int) -> np.ndarray:
+    """Multiply embedded gate unitaries of blocks (keys of the same number of qubits) in batch"""
+    d = 2 ** num_qubits
+    length = max([len(key[1]) for key in keys] + [1])
+    mats = np.empty((len(keys), length, d, d), dtype=complex)
+    mats[:] = np.identity(d)
+    for i, (_, gates) in enumerate(keys):
+        for j, (gate, positions) in enumerate(gates):
+            mats[i, j] = _embedded_unitary(gate, positions, num_qubits)
+    while mats.shape[1] > 1:  # U = M[L-1] ... M[1] M[0]
+        if mats.shape[1] % 2:
+            mats = np.concatenate([mats, np.broadcast_to(np.identity(d), (len(keys), 1, d, d))], axis=1)
+        mats = mats[:, 1::2] @ mats[:, 0::2]
+    return mats[:, 0]
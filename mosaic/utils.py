@@ -6,6 +6,14 @@ def is_power_of_two(num):
     return (num & (num - 1) == 0) and num != 0
 
 
+if hasattr(int, 'bit_count'):  # Python >= 3.10
+    popcount = int.bit_count
+else:
+    def popcount(mask: int) -> int:
+        """Number of 1 bits of a non-negative integer (e.g., number of qubits in a qubit bitmask)"""
+        return bin(mask).count('1')
+
+
 def infidelity(u: np.ndarray, v: np.ndarray) -> float:
     """Infidelity between two matrices"""
     if u.shape != v.shape:
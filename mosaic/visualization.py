@@ -0,0 +1,48 @@
+"""
+Visualization of circuit DAGs (imported lazily, since plotting backends are heavy to import)
+"""
+import cirq
+import rustworkx as rx
+import pydot
+import matplotlib.pyplot as plt
+from IPython.display import Image
+
+
+def draw_circ_dag_mpl(dag: rx.PyDiGraph, fname=None, figsize=None):
+    from .circuits import repr_circuit
+    from rustworkx.visualization import mpl_draw
+
+    colors = {1: 'white', 2: 'lightblue', 3: 'lightgreen', 4: 'lightpink',
+              5: 'lightyellow', 6: 'lightgray', 7: 'lightcyan', 8: 'lightcoral'}
+    node_colors = [colors[cirq.num_qubits(g)] for g in dag.nodes()]
+
+    if figsize:
+        plt.figure(figsize=figsize)
+
+    mpl_draw(dag, with_labels=True,
+            labels=str if isinstance(next(iter(dag.nodes())), cirq.GateOperation) else repr_circuit, 
+            node_color=node_colors,
+            edgecolors='grey',
+            node_size=450, font_size=6, font_weight='bold')
+    if fname:
+        plt.savefig(fname)
+
+
+def draw_circ_dag_graphviz(dag: rx.PyDiGraph, fname: str = None) -> Image:
+    from .circuits import repr_circuit
+
+    dot = pydot.Dot(graph_type='digraph')
+    gate_to_node = {}
+    colors = {1: 'white', 2: 'lightblue', 3: 'lightgreen', 4: 'lightpink',
+              5: 'lightyellow', 6: 'lightgray', 7: 'lightcyan', 8: 'lightcoral'}
+    for idx in dag.node_indices():
+        node = pydot.Node(idx, label=str(dag[idx]) if isinstance(dag[idx], cirq.GateOperation) else repr_circuit(dag[idx]),
+                          fillcolor=colors[cirq.num_qubits(dag[idx])], style='filled')
+        gate_to_node[idx] = node
+        dot.add_node(node)
+    for src, dst in dag.edge_list():
+        dot.add_edge(pydot.Edge(gate_to_node[src], gate_to_node[dst]))
+    dot.set_rankdir('LR')
+    if fname:
+        dot.write_png(fname)
+    return Image(dot.create_png())
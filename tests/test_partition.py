@@ -0,0 +1,79 @@
+"""
+Regression tests of partitioning against blocks of the baseline implementation
+"""
+import os
+import sys
+import json
+import cirq
+import pytest
+from cirq.contrib.qasm_import import circuit_from_qasm
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mosaic.partition import seq_partition, beam_partition, IncrementalPartition
+
+root_dpath = os.path.join(os.path.dirname(__file__), '..')
+
+# reprs of gates of each block from seq_partition on benchmarks/random/rand_8.qasm at the baseline, keyed by grain
+with open(os.path.join(os.path.dirname(__file__), 'data', 'rand_8_blocks.json'), 'r') as f:
+    GOLDEN_BLOCKS = json.load(f)
+
+
+@pytest.fixture(scope='module')
+def circ():
+    with open(os.path.join(root_dpath, 'benchmarks', 'random', 'rand_8.qasm'), 'r') as f:
+        return circuit_from_qasm(f.read())
+
+
+def block_reprs(blocks):
+    return [[repr(op) for op in blk.all_operations()] for blk in blocks]
+
+
+@pytest.mark.parametrize('grain', [2, 3])
+def test_seq_partition(circ, grain):
+    assert block_reprs(seq_partition(circ, grain)) == GOLDEN_BLOCKS[str(grain)]
+
+
+@pytest.mark.parametrize('grain', [2, 3])
+def test_seq_partition_workers(circ, grain):
+    assert block_reprs(seq_partition(circ, grain, workers=2)) == GOLDEN_BLOCKS[str(grain)]
+
+
+@pytest.mark.parametrize('grain', [2, 3])
+def test_seq_partition_views(circ, grain):
+    # views list the peeled leading 1Q gates first and then gates in the order they were consumed, which need not be
+    # the order of the circuit, but must keep the order of gates on each qubit (i.e., be a topological order)
+    views = seq_partition(circ, grain, as_views=True)
+    golden_blocks = seq_partition(circ, grain)
+    assert [sorted(blk) for blk in block_reprs(views)] == [sorted(blk) for blk in GOLDEN_BLOCKS[str(grain)]]
+    for view, golden in zip(views, golden_blocks):
+        for q in golden.all_qubits():
+            assert [op for op in view.all_operations() if q in op.qubits] == \
+                   [op for op in golden.all_operations() if q in op.qubits]
+
+
+@pytest.mark.parametrize('grain', [2, 3])
+def test_beam_partition_width_1(circ, grain):
+    assert block_reprs(beam_partition(circ, grain, beam_width=1)) == GOLDEN_BLOCKS[str(grain)]
+
+
+@pytest.mark.parametrize('gate_idx', [-1, 1])
+def test_incremental_partition_replace(gate_idx):
+    q0, q1, q2 = cirq.LineQubit.range(3)
+    ops = [cirq.H(q0), cirq.CZ(q0, q1), cirq.CZ(q1, q2)]
+    part = IncrementalPartition(ops, 2)
+    part.replace(gate_idx, cirq.CZ(q0, q2))
+    ops[gate_idx] = cirq.CZ(q0, q2)
+    assert part.circuit == cirq.Circuit(ops)
+    assert part.blocks == seq_partition(cirq.Circuit(ops), 2)
+
+
+@pytest.mark.parametrize('gate_idx', [3, -4])
+def test_incremental_partition_replace_out_of_range(gate_idx):
+    q0, q1, q2 = cirq.LineQubit.range(3)
+    ops = [cirq.H(q0), cirq.CZ(q0, q1), cirq.CZ(q1, q2)]
+    part = IncrementalPartition(ops, 2)
+    with pytest.raises(IndexError):
+        part.replace(gate_idx, cirq.CZ(q0, q2))
+    assert part.circuit == cirq.Circuit(ops)
+    assert part.blocks == seq_partition(cirq.Circuit(ops), 2)
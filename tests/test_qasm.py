@@ -0,0 +1,60 @@
+"""
+Tests of the streaming QASM reader against cirq's importer
+"""
+import os
+import re
+import sys
+import cirq
+import cirq.contrib.qasm_import
+import pytest
+from cirq.contrib.qasm_import import circuit_from_qasm
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mosaic import qasm
+from mosaic.partition import seq_partition, stream_partition
+
+HEADER = 'OPENQASM 2.0;\ninclude "qelib1.inc";\nqreg q[3];\ncreg c[3];\n'
+
+
+@pytest.fixture
+def write_qasm(tmp_path):
+    def write(body):
+        fname = tmp_path / 'circ.qasm'
+        fname.write_text(HEADER + body)
+        return str(fname)
+    return write
+
+
+def test_trailing_measurements(write_qasm, monkeypatch):
+    fname = write_qasm('h q[0];\ncx q[0],q[1];\ncx q[1],q[2];\nmeasure q -> c;\n')
+    with open(fname, 'r') as f:
+        circ = circuit_from_qasm(f.read())
+    unitary_part = cirq.Circuit(op for op in circ.all_operations() if not cirq.is_measurement(op))
+
+    def no_fallback(_):
+        raise AssertionError('fell back to cirq\'s importer')
+
+    monkeypatch.setattr(cirq.contrib.qasm_import, 'circuit_from_qasm', no_fallback)
+    measurements = []
+    gates = list(qasm.iter_qasm(fname, measurements=measurements))
+    assert [name for name, _, _ in gates] == ['h', 'cx', 'cx']
+    assert measurements == [(0, 'c', 0), (1, 'c', 1), (2, 'c', 2)]
+    assert cirq.Circuit(qasm.iter_qasm_ops(fname)) == unitary_part
+    assert qasm.read_qasm(fname, as_circuit=True) == unitary_part
+    assert list(stream_partition(qasm.iter_qasm_ops(fname), 2)) == seq_partition(unitary_part, 2)
+
+
+def test_fallback_before_yielding(write_qasm):
+    fname = write_qasm('h q[0];\nmeasure q[0] -> c[0];\nh q[0];\n')
+    with pytest.raises(qasm.UnsupportedQasm):
+        list(qasm.iter_qasm(fname))
+    with open(fname, 'r') as f:
+        assert list(qasm.iter_qasm_ops(fname)) == list(circuit_from_qasm(f.read()).all_operations())
+
+
+@pytest.mark.parametrize('body', ['h r[0];', 'h q[0]q[1];', 'rz(pi/0) q[0];', 'h q[5];', 'cx q, q[0];',
+                                  'measure q -> c[0];'])
+def test_malformed_statements(write_qasm, body):
+    with pytest.raises(qasm.UnsupportedQasm, match=re.escape(body.rstrip(';'))):
+        list(qasm.iter_qasm(write_qasm(body + '\n')))